@@ -0,0 +1,45 @@
+from nose.tools import eq_, ok_
+from tastypie.exceptions import BadRequest
+
+from mozillians.api.v1.paginator import Paginator
+from mozillians.common.paginator import decode_cursor
+from mozillians.common.tests import TestCase
+from mozillians.users.models import UserProfile
+from mozillians.users.tests import UserFactory
+
+
+class PaginatorTests(TestCase):
+    def test_cursor_pages(self):
+        profiles = [UserFactory.create().userprofile for i in range(3)]
+        objects = UserProfile.objects.all()
+
+        paginator = Paginator({'cursor': '', 'limit': 2}, objects, resource_uri='/api/v1/users/')
+        page = paginator.page()
+        eq_(page['objects'], profiles[:2])
+        eq_(decode_cursor(page['meta']['next_cursor']), profiles[1].id)
+        ok_(page['meta']['next'].startswith('/api/v1/users/?'))
+
+        paginator = Paginator({'cursor': page['meta']['next_cursor'], 'limit': 2}, objects,
+                              resource_uri='/api/v1/users/')
+        page = paginator.page()
+        eq_(page['objects'], profiles[2:])
+        eq_(page['meta']['next_cursor'], None)
+        eq_(page['meta']['next'], None)
+
+    def test_invalid_cursor(self):
+        paginator = Paginator({'cursor': 'foo'}, UserProfile.objects.all())
+        with self.assertRaises(BadRequest):
+            paginator.page()
+
+    def test_cursor_with_order_by(self):
+        paginator = Paginator({'cursor': '', 'order_by': 'name'}, UserProfile.objects.all())
+        with self.assertRaises(BadRequest):
+            paginator.page()
+
+    def test_offset_pages(self):
+        profile = UserFactory.create().userprofile
+        paginator = Paginator({'limit': 1, 'offset': 0}, UserProfile.objects.all())
+        page = paginator.page()
+        eq_(list(page['objects']), [profile])
+        eq_(page['meta']['total_count'], 1)
+        ok_('next_cursor' not in page['meta'])
@@ -1,10 +1,25 @@
 from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.utils.http import urlencode
 
 from tastypie import paginator
+from tastypie.exceptions import BadRequest
+
+from mozillians.common.paginator import decode_cursor, encode_cursor
 
 
 class Paginator(paginator.Paginator):
-    """Paginator with a hard limit on results per page."""
+    """Paginator with a hard limit on results per page.
+
+    Passing a cursor parameter, empty for the first page, walks the
+    objects by id instead of offset. Each page is filtered to the ids
+    after the last one of the previous page, so walking all objects
+    costs the same per page however deep it goes. The meta of every
+    page holds the cursor of the next one. Cursor pages are always
+    ordered by id, so passing an order_by parameter along with a cursor
+    is a bad request.
+
+    """
 
     def get_limit(self):
         """Determines the proper maximum number of results to return.
@@ -29,3 +44,49 @@ class Paginator(paginator.Paginator):
         Elastic Search crashes and timeouts.
         """
         return min(super(Paginator, self).get_offset(), self.get_count())
+
+    def get_count(self):
+        """Returns the total number of objects.
+
+        get_offset() and page() both need the count; it is computed
+        once per request instead of once per call.
+
+        """
+        if getattr(self, '_count', None) is None:
+            self._count = super(Paginator, self).get_count()
+        return self._count
+
+    def page(self):
+        if 'cursor' not in self.request_data:
+            return super(Paginator, self).page()
+
+        if 'order_by' in self.request_data:
+            raise BadRequest('The cursor and order_by parameters cannot be combined.')
+
+        limit = self.get_limit() or getattr(settings, 'HARD_API_LIMIT_PER_PAGE', 500)
+        try:
+            last_id = decode_cursor(self.request_data['cursor'])
+        except InvalidPage:
+            raise BadRequest('Invalid cursor.')
+
+        objects = list(self.objects.filter(id__gt=last_id).order_by('id')[:limit])
+        next_cursor = None
+        if len(objects) == limit:
+            next_cursor = encode_cursor(objects[-1].pk)
+        return {
+            self.collection_name: objects,
+            'meta': {
+                'limit': limit,
+                'next_cursor': next_cursor,
+                'next': self._generate_cursor_uri(limit, next_cursor)
+            }
+        }
+
+    def _generate_cursor_uri(self, limit, cursor):
+        if self.resource_uri is None or cursor is None:
+            return None
+
+        params = dict((key, value) for key, value in self.request_data.items()
+                      if key not in ['limit', 'offset', 'cursor'])
+        params.update({'limit': limit, 'cursor': cursor})
+        return '%s?%s' % (self.resource_uri, urlencode(params))
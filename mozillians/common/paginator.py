@@ -0,0 +1,60 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.paginator import EmptyPage, InvalidPage, PageNotAnInteger, Paginator
+
+
+def encode_cursor(last_id):
+    """Return an opaque cursor pointing after the object with last_id."""
+    return urlsafe_b64encode(json.dumps({'id': last_id}))
+
+
+def decode_cursor(cursor):
+    """Return the id of the object cursor points after.
+
+    An empty cursor points to the start, before any object.
+
+    """
+    if not cursor:
+        return 0
+    try:
+        return int(json.loads(urlsafe_b64decode(str(cursor)))['id'])
+    except (TypeError, ValueError, KeyError):
+        raise InvalidPage('Invalid cursor')
+
+
+class SearchPaginator(Paginator):
+    """Paginator for Elasticsearch searches.
+
+    Django's Paginator counts the results with a request of its own
+    before searching for the requested page. This paginator searches
+    for the page and reads the total number of hits from the same
+    response.
+
+    search is the executed search of the last page, to read other
+    parts of its response, e.g. aggregations, without another request.
+
+    """
+    search = None
+
+    def page(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        search = self.object_list[bottom:top + self.orphans]
+        object_list = list(search)
+        # The search has been executed, count() returns the total
+        # hits of its response without another request.
+        self._count = search.count()
+        self.search = search
+        self._num_pages = None
+        number = self.validate_number(number)
+        if top + self.orphans < self._count:
+            object_list = object_list[:self.per_page]
+        return self._get_page(object_list, number, self)
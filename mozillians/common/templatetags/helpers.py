@@ -62,7 +62,13 @@ def urlparams(url_, hash=None, **query):
 
 def gravatar(email, default_avatar_url=settings.DEFAULT_AVATAR_URL, size=175, rating='pg'):
     """Return the Gravatar URL for an email address."""
-    url = GRAVATAR_URL.format(emaildigest=md5(email).hexdigest())
+    return gravatar_from_digest(md5(email).hexdigest(), default_avatar_url, size, rating)
+
+
+def gravatar_from_digest(emaildigest, default_avatar_url=settings.DEFAULT_AVATAR_URL,
+                         size=175, rating='pg'):
+    """Return the Gravatar URL for the MD5 digest of an email address."""
+    url = GRAVATAR_URL.format(emaildigest=emaildigest)
     url = urlparams(url, d=utils.absolutify(default_avatar_url), s=size, r=rating)
     return url
 
@@ -34,7 +34,7 @@ ES_INDEXES = {
                    ES_INDEXES=ES_INDEXES)
 class TestCase(BaseTestCase):
     def __init__(self, *args, **kwargs):
-        from elasticutils.contrib.django import get_es
+        from mozillians.users.es import get_es
         es = get_es()
 
         es.indices.create(index=ES_INDEXES['default'], ignore=400)
@@ -0,0 +1,66 @@
+from django.core.paginator import EmptyPage, InvalidPage, PageNotAnInteger
+
+from mock import MagicMock
+from nose.tools import eq_, ok_
+
+from mozillians.common.paginator import SearchPaginator, decode_cursor, encode_cursor
+from mozillians.common.tests import TestCase
+
+
+class SearchPaginatorTests(TestCase):
+    def search(self, results, total):
+        search = MagicMock()
+        page = search.__getitem__.return_value
+        page.__iter__.return_value = iter(results)
+        page.count.return_value = total
+        return search
+
+    def test_page(self):
+        search = self.search(range(10, 20), 45)
+        paginator = SearchPaginator(search, 10)
+        page = paginator.page(2)
+        search.__getitem__.assert_called_with(slice(10, 20))
+        eq_(list(page), range(10, 20))
+        eq_(paginator.count, 45)
+        eq_(paginator.num_pages, 5)
+        ok_(not search.count.called)
+        eq_(paginator.search, search[10:20])
+
+    def test_page_with_orphans(self):
+        search = self.search(range(10, 23), 23)
+        paginator = SearchPaginator(search, 10, orphans=3)
+        page = paginator.page(2)
+        search.__getitem__.assert_called_with(slice(10, 23))
+        eq_(list(page), range(10, 23))
+
+    def test_page_out_of_range(self):
+        search = self.search([], 5)
+        paginator = SearchPaginator(search, 10)
+        with self.assertRaises(EmptyPage):
+            paginator.page(3)
+
+    def test_empty_first_page(self):
+        search = self.search([], 0)
+        paginator = SearchPaginator(search, 10)
+        eq_(list(paginator.page(1)), [])
+
+    def test_invalid_page(self):
+        paginator = SearchPaginator(self.search([], 0), 10)
+        with self.assertRaises(PageNotAnInteger):
+            paginator.page('foo')
+        with self.assertRaises(EmptyPage):
+            paginator.page(0)
+
+
+class CursorTests(TestCase):
+    def test_cursor(self):
+        eq_(decode_cursor(encode_cursor(42)), 42)
+
+    def test_empty_cursor(self):
+        eq_(decode_cursor(''), 0)
+        eq_(decode_cursor(None), 0)
+
+    def test_invalid_cursor(self):
+        for cursor in ['foo', encode_cursor('foo'), u'\xe9']:
+            with self.assertRaises(InvalidPage):
+                decode_cursor(cursor)
@@ -0,0 +1,26 @@
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.common.utils import bump_cache_version, cache_version
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheVersionTests(TestCase):
+    def test_cache_version(self):
+        version = cache_version('foo')
+        eq_(cache_version('foo'), version)
+        bump_cache_version('foo')
+        ok_(cache_version('foo') > version)
+
+    def test_namespaces(self):
+        version = cache_version('bar')
+        bump_cache_version('foo')
+        eq_(cache_version('bar'), version)
+
+    def test_bump_evicted_version(self):
+        bump_cache_version('foo')
+        ok_(cache.get('foo:cache_version') is not None)
@@ -1,4 +1,7 @@
+import time
+
 from django.conf import settings
+from django.core.cache import cache
 
 
 def absolutify(url):
@@ -16,3 +19,27 @@ def absolutify(url):
             site_url = ''.join(map(str, (protocol, hostname, ':', port)))
 
     return site_url + url
+
+
+def cache_version(namespace):
+    """Return the current version of the cached values of namespace.
+
+    Cache keys including the version go stale at once when it is bumped
+    with bump_cache_version(), without deleting them one by one.
+
+    """
+    key = '%s:cache_version' % namespace
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        cache.add(key, version, None)
+    return version
+
+
+def bump_cache_version(namespace):
+    """Make all cached values of namespace stale."""
+    key = '%s:cache_version' % namespace
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
@@ -1,4 +1,57 @@
+from hashlib import md5
+
+from django.core.cache import cache
 from django.db import models
+from django.db.models import signals as dbsignals
+from django.dispatch import receiver
+
+from mozillians.common.utils import bump_cache_version, cache_version
+
+
+LOCATION_CACHE_TIMEOUT = 60 * 60
+
+
+def _location_cache_key(name):
+    """Return the cache key of name for the current version of locations."""
+    return 'geo:%s:%s' % (cache_version('geo'), name)
+
+
+def invalidate_location_cache():
+    """Make all cached location lookups stale."""
+    bump_cache_version('geo')
+
+
+def get_location_ids(country, region=None, city=None):
+    """Return the ids matching the names of a location.
+
+    Names are matched case insensitively, regions within the matched
+    countries and cities within the matched countries and regions.
+    Returns a (country_ids, region_ids, city_ids) tuple of lists, with
+    None in place of the names that are not given. Lookups are cached
+    until a country, region or city changes.
+
+    """
+    names = u'\n'.join([country, region or '', city or ''])
+    key = _location_cache_key(md5(names.lower().encode('utf-8')).hexdigest())
+    ids = cache.get(key)
+    if ids is not None:
+        return ids
+
+    country_ids = list(Country.objects.filter(name__iexact=country)
+                       .values_list('id', flat=True))
+    region_ids = city_ids = None
+    if region is not None:
+        region_ids = list(Region.objects.filter(name__iexact=region, country__in=country_ids)
+                          .values_list('id', flat=True))
+    if city is not None:
+        cities = City.objects.filter(name__iexact=city, country__in=country_ids)
+        if region_ids is not None:
+            cities = cities.filter(region__in=region_ids)
+        city_ids = list(cities.values_list('id', flat=True))
+
+    ids = (country_ids, region_ids, city_ids)
+    cache.set(key, ids, LOCATION_CACHE_TIMEOUT)
+    return ids
 
 
 class Country(models.Model):
@@ -69,3 +122,13 @@ class City(models.Model):
 
     def __unicode__(self):
         return u', '.join([x.name for x in self, self.region, self.country if x])
+
+
+@receiver([dbsignals.post_save, dbsignals.post_delete], sender=Country,
+          dispatch_uid='invalidate_location_cache_country_sig')
+@receiver([dbsignals.post_save, dbsignals.post_delete], sender=Region,
+          dispatch_uid='invalidate_location_cache_region_sig')
+@receiver([dbsignals.post_save, dbsignals.post_delete], sender=City,
+          dispatch_uid='invalidate_location_cache_city_sig')
+def invalidate_location_cache_receiver(sender, **kwargs):
+    invalidate_location_cache()
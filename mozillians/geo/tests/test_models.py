@@ -0,0 +1,50 @@
+from django.test.utils import override_settings
+
+from nose.tools import eq_
+
+from mozillians.common.tests import TestCase
+from mozillians.geo.models import get_location_ids
+from mozillians.geo.tests import CityFactory, CountryFactory, RegionFactory
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GetLocationIdsTests(TestCase):
+    def test_country(self):
+        country = CountryFactory.create(name='Greece')
+        CountryFactory.create()
+        eq_(get_location_ids('greece'), ([country.id], None, None))
+
+    def test_unknown_country(self):
+        eq_(get_location_ids('Atlantis', 'Foo', 'Bar'), ([], [], []))
+
+    def test_region_and_city(self):
+        region = RegionFactory.create(name='Attica')
+        city = CityFactory.create(name='Athens', region=region)
+        # Same names in another country.
+        other_region = RegionFactory.create(name='Attica')
+        CityFactory.create(name='Athens', region=other_region)
+        # Same name in another region of the country.
+        CityFactory.create(name='Athens', country=region.country,
+                           region=RegionFactory.create(country=region.country))
+
+        eq_(get_location_ids(region.country.name, 'ATTICA', 'athens'),
+            ([region.country.id], [region.id], [city.id]))
+
+    def test_city_without_region(self):
+        city = CityFactory.create(name='Athens')
+        eq_(get_location_ids(city.country.name, city=city.name),
+            ([city.country.id], None, [city.id]))
+
+    def test_cached_until_locations_change(self):
+        country = CountryFactory.create(name='Greece')
+        with self.assertNumQueries(1):
+            get_location_ids('Greece')
+            get_location_ids('Greece')
+
+        country.name = 'Hellas'
+        country.save()
+        eq_(get_location_ids('Greece'), ([], None, None))
+        eq_(get_location_ids('Hellas'), ([country.id], None, None))
@@ -1,5 +1,10 @@
+from hashlib import md5
+
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import signals as dbsignals
+from django.dispatch import receiver
 from django.utils.timezone import now
 
 from autoslug.fields import AutoSlugField
@@ -7,13 +12,26 @@ from django.utils.translation import ugettext as _
 from django.utils.translation import ugettext_lazy as _lazy
 
 from mozillians.common.urlresolvers import reverse
-from mozillians.common.utils import absolutify
+from mozillians.common.utils import absolutify, bump_cache_version, cache_version
 from mozillians.groups.managers import GroupBaseManager, GroupQuerySet
 from mozillians.groups.templatetags.helpers import slugify
 from mozillians.groups.tasks import email_membership_change, member_removed_email
 from mozillians.users.tasks import update_basket_task
 
 
+GROUP_CACHE_TIMEOUT = 60 * 60
+
+
+def _group_cache_key(name):
+    """Return the cache key of name for the current version of groups."""
+    return 'groups:%s:%s' % (cache_version('groups'), name)
+
+
+def invalidate_group_cache():
+    """Make all cached group lookups stale."""
+    bump_cache_version('groups')
+
+
 class GroupBase(models.Model):
     name = models.CharField(db_index=True, max_length=50,
                             unique=True, verbose_name=_lazy(u'Name'))
@@ -208,6 +226,16 @@ class Group(GroupBase):
         """Return all visible groups that are functional areas."""
         return cls.objects.visible().filter(functional_area=True)
 
+    @classmethod
+    def get_cached_functional_areas(cls):
+        """Return a list of the functional areas, cached until groups change."""
+        key = _group_cache_key('functional_areas')
+        groups = cache.get(key)
+        if groups is None:
+            groups = list(cls.get_functional_areas())
+            cache.set(key, groups, GROUP_CACHE_TIMEOUT)
+        return groups
+
     @classmethod
     def get_non_functional_areas(cls, **kwargs):
         """
@@ -226,6 +254,17 @@ class Group(GroupBase):
     def search(cls, query):
         return super(Group, cls).search(query).visible()
 
+    @classmethod
+    def cached_search(cls, query):
+        """Return a list of the search results, cached until groups change."""
+        digest = md5(query.lower().encode('utf-8')).hexdigest()
+        key = _group_cache_key('search:%s' % digest)
+        groups = cache.get(key)
+        if groups is None:
+            groups = list(cls.search(query))
+            cache.set(key, groups, GROUP_CACHE_TIMEOUT)
+        return groups
+
     def get_absolute_url(self):
         return absolutify(reverse('groups:show_group', args=[self.url]))
 
@@ -284,7 +323,9 @@ class Group(GroupBase):
 
     def remove_member(self, userprofile, send_email=True):
         try:
-            membership = GroupMembership.objects.get(group=self, userprofile=userprofile)
+            # Through userprofile, the membership refers to the same
+            # instance, so that deleting it clears its privacy level cache.
+            membership = userprofile.groupmembership_set.get(group=self)
         except GroupMembership.DoesNotExist:
             return
         old_status = membership.status
@@ -349,3 +390,15 @@ class Invite(models.Model):
 
     def __unicode__(self):
         return 'Invite #{}'.format(self.id)
+
+
+@receiver([dbsignals.post_save, dbsignals.post_delete], sender=Group,
+          dispatch_uid='invalidate_group_cache_group_sig')
+@receiver([dbsignals.post_save, dbsignals.post_delete], sender=GroupAlias,
+          dispatch_uid='invalidate_group_cache_alias_sig')
+@receiver([dbsignals.post_save, dbsignals.post_delete], sender=GroupMembership,
+          dispatch_uid='invalidate_group_cache_membership_sig')
+@receiver([dbsignals.post_save, dbsignals.post_delete], sender=Skill,
+          dispatch_uid='invalidate_group_cache_skill_sig')
+def invalidate_group_cache_receiver(sender, **kwargs):
+    invalidate_group_cache()
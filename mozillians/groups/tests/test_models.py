@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
 
 from nose.tools import eq_, ok_
 
@@ -216,6 +217,26 @@ class GroupTests(TestCase):
         GroupFactory.create(functional_area=False)
         eq_(set(Group.get_functional_areas()), set([cgroup_1]))
 
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_get_cached_functional_areas(self):
+        group_1 = GroupFactory.create(functional_area=True)
+        eq_(Group.get_cached_functional_areas(), [group_1])
+        with self.assertNumQueries(0):
+            eq_(Group.get_cached_functional_areas(), [group_1])
+        group_2 = GroupFactory.create(name='zzz', functional_area=True)
+        eq_(Group.get_cached_functional_areas(), [group_1, group_2])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cached_search_invalidated_by_membership(self):
+        group = GroupFactory.create(name='cached')
+        eq_(Group.cached_search('Cached')[0].member_count, 0)
+        with self.assertNumQueries(0):
+            eq_(Group.cached_search('cached'), [group])
+        group.add_member(UserFactory.create().userprofile)
+        eq_(Group.cached_search('cached')[0].member_count, 1)
+
     def test_deleted_curator_sets_null(self):
         user = UserFactory.create()
         group = GroupFactory.create()
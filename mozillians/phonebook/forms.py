@@ -82,12 +82,25 @@ class SearchForm(happyforms.Form):
         max_value=settings.ITEMS_PER_PAGE)
     include_non_vouched = forms.BooleanField(
         label=_lazy(u'Include non-vouched'), required=False)
+    facets = forms.BooleanField(
+        label=_lazy(u'Count results by location, group, skill and language'),
+        required=False)
 
     def clean_limit(self):
         limit = self.cleaned_data['limit'] or settings.ITEMS_PER_PAGE
         return limit
 
 
+class NearForm(happyforms.Form):
+    lat = forms.FloatField(min_value=-90, max_value=90)
+    lng = forms.FloatField(min_value=-180, max_value=180)
+    distance = forms.IntegerField(required=False, min_value=settings.NEAR_MIN_DISTANCE,
+                                  max_value=settings.NEAR_MAX_DISTANCE)
+
+    def clean_distance(self):
+        return self.cleaned_data['distance'] or settings.NEAR_DEFAULT_DISTANCE
+
+
 def filter_vouched(qs, choice):
     if choice == SearchFilter.CHOICE_ONLY_VOUCHED:
         return qs.filter(is_vouched=True)
@@ -119,6 +132,30 @@ class SearchFilter(django_filters.FilterSet):
         super(SearchFilter, self).__init__(*args, **kwargs)
         self.filters['timezone'].field.choices.insert(0, ('', _lazy(u'All timezones')))
 
+    def filter_search(self, search):
+        """Apply the filters to an Elasticsearch search of UserProfiles.
+
+        Matches the same profiles as qs, using the values stored in
+        the search index instead of querying the database.
+
+        """
+        if not self.form.is_valid():
+            return search.filter(id__in=[])
+
+        data = self.form.cleaned_data
+        vouched = data.get('vouched')
+        if vouched == self.CHOICE_ONLY_VOUCHED:
+            search = search.filter(is_vouched=True)
+        elif vouched == self.CHOICE_ONLY_UNVOUCHED:
+            search = search.filter(is_vouched=False)
+        if data.get('skills'):
+            search = search.filter(skill_ids__in=[skill.id for skill in data['skills']])
+        if data.get('groups'):
+            search = search.filter(group_ids__in=[group.id for group in data['groups']])
+        if data.get('timezone'):
+            search = search.filter(timezone=data['timezone'])
+        return search
+
 
 class UserForm(happyforms.ModelForm):
     """Instead of just inhereting form a UserProfile model form, this
@@ -1,14 +1,16 @@
 from django.forms import model_to_dict
 from django.test.utils import override_settings
 
-from mock import MagicMock, patch
+from mock import MagicMock, call, patch
 from mozillians.geo.tests import CountryFactory
 from nose.tools import eq_, ok_
 
 from mozillians.common.tests import TestCase
 from mozillians.groups.models import Skill
+from mozillians.groups.tests import GroupFactory, SkillFactory
 from mozillians.phonebook.forms import (ContributionForm, EmailForm, ExternalAccountForm,
-                                        LocationForm, SearchForm, SkillsForm, filter_vouched)
+                                        LocationForm, SearchFilter, SearchForm, SkillsForm,
+                                        filter_vouched)
 from mozillians.users.models import UserProfile
 from mozillians.users.tests import UserFactory
 
@@ -46,6 +48,33 @@ class TestFilterVouched(TestCase):
         eq_(filter_vouched(qs, 'no').count(), 4)
 
 
+class SearchFilterTests(TestCase):
+    def test_filter_search(self):
+        group = GroupFactory.create()
+        skill = SkillFactory.create()
+        search = MagicMock()
+        search.filter.return_value = search
+        filtr = SearchFilter({'vouched': 'yes', 'skills': [skill.id], 'groups': [group.id],
+                              'timezone': 'Europe/Athens'})
+        eq_(filtr.filter_search(search), search)
+        search.filter.assert_has_calls([call(is_vouched=True),
+                                        call(skill_ids__in=[skill.id]),
+                                        call(group_ids__in=[group.id]),
+                                        call(timezone='Europe/Athens')])
+
+    def test_filter_search_all(self):
+        search = MagicMock()
+        filtr = SearchFilter({'vouched': 'all', 'timezone': ''})
+        eq_(filtr.filter_search(search), search)
+        ok_(not search.filter.called)
+
+    def test_filter_search_invalid(self):
+        search = MagicMock()
+        filtr = SearchFilter({'vouched': 'foo'})
+        filtr.filter_search(search)
+        search.filter.assert_called_with(id__in=[])
+
+
 class EmailFormTests(TestCase):
     def test_email_changed_false(self):
         user = UserFactory.create(email='foo@bar.com')
@@ -46,8 +46,8 @@ class ListTests(TestCase):
         eq_(response.context['people'].paginator.count, 2)
         eq_(response.context['people'].paginator.num_pages, 2)
         eq_(response.context['people'].number, 1)
-        eq_(response.context['people'].object_list[0],
-            user_listed_1.userprofile)
+        eq_(response.context['people'].object_list[0].id,
+            user_listed_1.userprofile.id)
 
     @patch('mozillians.groups.views.settings.ITEMS_PER_PAGE', 1)
     def test_list_mozillians_in_location_country_second_page(self):
@@ -63,8 +63,8 @@ class ListTests(TestCase):
         eq_(response.context['people'].paginator.count, 2)
         eq_(response.context['people'].paginator.num_pages, 2)
         eq_(response.context['people'].number, 2)
-        eq_(response.context['people'].object_list[0],
-            user_listed_2.userprofile)
+        eq_(response.context['people'].object_list[0].id,
+            user_listed_2.userprofile.id)
 
     @patch('mozillians.groups.views.settings.ITEMS_PER_PAGE', 1)
     def test_list_mozillians_in_location_country_empty_page(self):
@@ -118,7 +118,7 @@ class ListTests(TestCase):
         eq_(response.context['city_name'], None)
         eq_(response.context['region_name'], region.name)
         eq_(response.context['people'].paginator.count, 1)
-        eq_(response.context['people'].object_list[0], user_listed.userprofile)
+        eq_(response.context['people'].object_list[0].id, user_listed.userprofile.id)
 
     def test_list_mozillians_in_location_city_vouched(self):
         country = CountryFactory.create()
@@ -145,7 +145,7 @@ class ListTests(TestCase):
         eq_(response.context['city_name'], city.name)
         eq_(response.context['region_name'], None)
         eq_(response.context['people'].paginator.count, 1)
-        eq_(response.context['people'].object_list[0], user_listed.userprofile)
+        eq_(response.context['people'].object_list[0].id, user_listed.userprofile.id)
 
     def test_list_mozillians_in_location_region_n_city_vouched(self):
         """
@@ -182,7 +182,7 @@ class ListTests(TestCase):
         eq_(response.context['city_name'], city.name)
         eq_(response.context['region_name'], region.name)
         eq_(response.context['people'].paginator.count, 1)
-        eq_(response.context['people'].object_list[0], user_listed.userprofile)
+        eq_(response.context['people'].object_list[0].id, user_listed.userprofile.id)
 
     def test_list_mozillians_in_location_invalid_country(self):
         user = UserFactory.create()
@@ -1,6 +1,8 @@
+import json
 import os.path
 from datetime import datetime
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.views import logout as logout_view
 from django.core.urlresolvers import reverse
@@ -46,6 +48,67 @@ class SearchTests(TestCase):
             'application/opensearchdescription+xml')
 
 
+class SearchSuggestTests(TestCase):
+    @patch('mozillians.phonebook.views.UserProfileMappingType.suggest')
+    def test_suggest_anonymous(self, suggest_mock):
+        suggest_mock.return_value = [{'username': 'foo', 'full_name': 'Foo Bar'}]
+        client = Client()
+        response = client.get(reverse('phonebook:search_suggest'), {'term': 'fo'})
+        eq_(response.status_code, 200)
+        eq_(response.get('content-type'), 'application/json')
+        eq_(json.loads(response.content), [{'username': 'foo', 'full_name': 'Foo Bar'}])
+        suggest_mock.assert_called_with('fo', public=True)
+
+    @patch('mozillians.phonebook.views.UserProfileMappingType.suggest')
+    def test_suggest_vouched(self, suggest_mock):
+        suggest_mock.return_value = []
+        user = UserFactory.create()
+        with self.login(user) as client:
+            response = client.get(reverse('phonebook:search_suggest'), {'term': 'fo'})
+        eq_(response.status_code, 200)
+        suggest_mock.assert_called_with('fo', public=False)
+
+    def test_suggest_without_term(self):
+        client = Client()
+        response = client.get(reverse('phonebook:search_suggest'))
+        eq_(response.status_code, 400)
+
+
+class ListNearTests(TestCase):
+    def empty_search(self, search_mock):
+        page = search_mock.return_value.__getitem__.return_value
+        page.__iter__.return_value = iter([])
+        page.count.return_value = 0
+
+    @patch('mozillians.phonebook.views.UserProfileMappingType.search_near')
+    def test_list_near_anonymous(self, search_near_mock):
+        self.empty_search(search_near_mock)
+        client = Client()
+        response = client.get(reverse('phonebook:list_near'), {'lat': 39.7, 'lng': 21.6})
+        eq_(response.status_code, 200)
+        self.assertJinja2TemplateUsed(response, 'phonebook/near_list.html')
+        search_near_mock.assert_called_with(39.7, 21.6, settings.NEAR_DEFAULT_DISTANCE,
+                                            privacy_level=PUBLIC, public=True)
+
+    @patch('mozillians.phonebook.views.UserProfileMappingType.search_near')
+    def test_list_near_vouched(self, search_near_mock):
+        self.empty_search(search_near_mock)
+        user = UserFactory.create()
+        with self.login(user) as client:
+            response = client.get(reverse('phonebook:list_near'),
+                                  {'lat': 39.7, 'lng': 21.6, 'distance': 10})
+        eq_(response.status_code, 200)
+        search_near_mock.assert_called_with(39.7, 21.6, 10, privacy_level=MOZILLIANS,
+                                            public=False)
+
+    @patch('mozillians.phonebook.views.UserProfileMappingType.search_near')
+    def test_list_near_invalid(self, search_near_mock):
+        client = Client()
+        response = client.get(reverse('phonebook:list_near'), {'lat': 100, 'lng': 21.6})
+        eq_(response.status_code, 200)
+        ok_(not search_near_mock.called)
+
+
 class InviteTests(TestCase):
     @requires_login()
     def test_invite_anonymous(self):
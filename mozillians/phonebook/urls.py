@@ -26,6 +26,7 @@ urlpatterns = patterns(
     url(r'^delete/$', 'views.delete', name='profile_delete'),
     url(r'^opensearch.xml$', 'views.search_plugin', name='search_plugin'),
     url(r'^search/$', 'views.search', name='search'),
+    url(r'^search/suggest/$', 'views.search_suggest', name='search_suggest'),
     url(r'^betasearch/$', 'views.betasearch', name='betasearch'),
     url(r'^invite/$', 'views.invite', name='invite'),
     url(r'^invite/(?P<invite_pk>\d+)/delete/$', 'views.delete_invite', name='delete_invite'),
@@ -38,6 +39,7 @@ urlpatterns = patterns(
         'views.list_mozillians_in_location', name='list_region_city'),
     url(r'^country/(?P<country>[A-Za-z0-9 \.]+)/region/(?P<region>.+)/$',
         'views.list_mozillians_in_location', name='list_region'),
+    url(r'^near/$', 'views.list_mozillians_near', name='list_near'),
     url(r'^apikeys/$', 'views.apikeys', name='apikeys'),
     url(r'^apikey/(?P<api_pk>\d+)/delete/$', 'views.delete_apikey', name='apikey_delete'),
 
@@ -1,3 +1,5 @@
+import json
+
 from django.conf import settings
 from django.contrib.auth.views import logout as auth_logout
 from django.contrib import messages
@@ -5,7 +7,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db import transaction
-from django.http import HttpResponseRedirect, Http404
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, Http404
 from django.shortcuts import get_object_or_404, render
 from django.utils import timezone
 from django.utils.safestring import mark_safe
@@ -20,7 +22,9 @@ from mozillians.api.models import APIv2App
 from mozillians.common.decorators import allow_public, allow_unvouched
 from mozillians.common.templatetags.helpers import redirect, urlparams
 from mozillians.common.middleware import LOGIN_MESSAGE, GET_VOUCHED_MESSAGE
+from mozillians.common.paginator import SearchPaginator
 from mozillians.common.urlresolvers import reverse
+from mozillians.geo.models import get_location_ids
 from mozillians.groups.models import Group
 from mozillians.phonebook.models import Invite
 from mozillians.phonebook.utils import redeem_invite
@@ -339,22 +343,28 @@ def search(request):
     form = forms.SearchForm(request.GET)
     groups = None
     functional_areas = None
+    facets = None
 
     if form.is_valid():
         query = form.cleaned_data.get('q', u'')
         limit = form.cleaned_data['limit']
         include_non_vouched = form.cleaned_data['include_non_vouched']
+        with_facets = form.cleaned_data['facets']
         page = request.GET.get('page', 1)
-        functional_areas = Group.get_functional_areas()
+        functional_areas = Group.get_cached_functional_areas()
         public = not (request.user.is_authenticated() and
                       request.user.userprofile.is_vouched)
 
         profiles = UserProfileMappingType.search(
-            query, public=public, include_non_vouched=include_non_vouched)
+            query, public=public, include_non_vouched=include_non_vouched, facets=with_facets)
+        if settings.ES_SOURCE_ONLY_SEARCH:
+            profiles = profiles.source_only()
+        if settings.ES_SEARCH_CACHE_TIMEOUT:
+            profiles = profiles.cached()
         if not public:
-            groups = Group.search(query)
+            groups = Group.cached_search(query)
 
-        paginator = Paginator(profiles, limit)
+        paginator = SearchPaginator(profiles, limit)
 
         try:
             people = paginator.page(page)
@@ -363,17 +373,22 @@ def search(request):
         except EmptyPage:
             people = paginator.page(paginator.num_pages)
 
-        if profiles.count() == 1 and not groups:
+        show_pagination = paginator.count > settings.ITEMS_PER_PAGE
+
+        if paginator.count == 1 and not groups:
             return redirect('phonebook:profile_view', people[0].user.username)
 
-        show_pagination = paginator.count > settings.ITEMS_PER_PAGE
+        if with_facets:
+            # Facets are counted by the search of the page.
+            facets = UserProfileMappingType.get_facets(paginator.search.aggregations())
 
     d = dict(people=people,
              search_form=form,
              limit=limit,
              show_pagination=show_pagination,
              groups=groups,
-             functional_areas=functional_areas)
+             functional_areas=functional_areas,
+             facets=facets)
 
     return render(request, 'phonebook/search.html', d)
 
@@ -383,10 +398,9 @@ def betasearch(request):
     """This view is for researching new search and data filtering
     options. It will eventually replace the 'search' view.
 
-    Filtering using SearchFilter does not respect privacy levels
-    because it directly hits the db. This should be further
-    investigated before the feature is released to the
-    public. Meanwhile we limit searches only to vouched users.
+    SearchFilter is applied as Elasticsearch filters on the indexed
+    vouched status, group and skill ids and timezone, which respect
+    the privacy of the index searched.
 
     This view is behind the 'betasearch' waffle flag.
 
@@ -404,13 +418,14 @@ def betasearch(request):
         public = not (request.user.is_authenticated() and
                       request.user.userprofile.is_vouched)
 
-        profiles_matching_filter = list(filtr.qs.values_list('id', flat=True))
         profiles = UserProfileMappingType.search(query,
                                                  include_non_vouched=True,
                                                  public=public)
-        profiles = profiles.filter(id__in=profiles_matching_filter)
+        profiles = filtr.filter_search(profiles)
+        if settings.ES_SEARCH_CACHE_TIMEOUT:
+            profiles = profiles.cached()
 
-        paginator = Paginator(profiles, limit)
+        paginator = SearchPaginator(profiles, limit)
 
         try:
             people = paginator.page(page)
@@ -430,6 +445,24 @@ def betasearch(request):
     return render(request, 'phonebook/betasearch.html', data)
 
 
+@allow_public
+def search_suggest(request):
+    """Return names and usernames completing the term GET parameter.
+
+    Used for search-as-you-type. Anonymous and unvouched users only
+    get suggestions from the public index.
+
+    """
+    term = request.GET.get('term', '').strip()
+    if not term:
+        return HttpResponseBadRequest()
+
+    public = not (request.user.is_authenticated() and
+                  request.user.userprofile.is_vouched)
+    suggestions = UserProfileMappingType.suggest(term, public=public)
+    return HttpResponse(json.dumps(suggestions), content_type='application/json')
+
+
 @allow_public
 @cache_control(public=True, must_revalidate=True, max_age=3600 * 24 * 7)  # 1 week.
 def search_plugin(request):
@@ -508,13 +541,17 @@ def delete_apikey(request, api_pk):
 
 
 def list_mozillians_in_location(request, country, region=None, city=None):
-    queryset = UserProfile.objects.vouched().filter(geo_country__name__iexact=country)
+    # Resolve the names once and filter on the indexed foreign keys
+    # instead of joining the geo tables on every page.
+    country_ids, region_ids, city_ids = get_location_ids(country, region, city)
+    queryset = UserProfile.objects.vouched().filter(geo_country__in=country_ids)
     show_pagination = False
 
     if city:
-        queryset = queryset.filter(geo_city__name__iexact=city)
+        queryset = queryset.filter(geo_city__in=city_ids)
     if region:
-        queryset = queryset.filter(geo_region__name__iexact=region)
+        queryset = queryset.filter(geo_region__in=region_ids)
+    queryset = queryset.views()
 
     paginator = Paginator(queryset, settings.ITEMS_PER_PAGE)
     page = request.GET.get('page', 1)
@@ -538,6 +575,44 @@ def list_mozillians_in_location(request, country, region=None, city=None):
     return render(request, 'phonebook/location_list.html', data)
 
 
+@allow_public
+def list_mozillians_near(request):
+    """List vouched Mozillians near the lat and lng GET parameters.
+
+    Results are the profiles located within the distance GET parameter,
+    in km, of the point, closest first. Profiles are located by the
+    coordinates of their city, never by their own lat and lng, so only
+    those whose privacy_geo_city is visible to the viewer are listed.
+
+    """
+    form = forms.NearForm(request.GET)
+    people = []
+    show_pagination = False
+
+    if form.is_valid():
+        public = not (request.user.is_authenticated() and
+                      request.user.userprofile.is_vouched)
+        privacy_level = PUBLIC if public else request.user.userprofile.privacy_level
+        profiles = UserProfileMappingType.search_near(
+            form.cleaned_data['lat'], form.cleaned_data['lng'], form.cleaned_data['distance'],
+            privacy_level=privacy_level, public=public)
+        paginator = SearchPaginator(profiles, settings.ITEMS_PER_PAGE)
+
+        try:
+            people = paginator.page(request.GET.get('page', 1))
+        except PageNotAnInteger:
+            people = paginator.page(1)
+        except EmptyPage:
+            people = paginator.page(paginator.num_pages)
+
+        show_pagination = paginator.count > settings.ITEMS_PER_PAGE
+
+    data = {'people': people,
+            'near_form': form,
+            'show_pagination': show_pagination}
+    return render(request, 'phonebook/near_list.html', data)
+
+
 @allow_unvouched
 def logout(request):
     """View that logs out the user and redirects to home page."""
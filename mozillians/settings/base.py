@@ -421,7 +421,32 @@ ES_DISABLED = True
 ES_URLS = ['http://127.0.0.1:9200']
 ES_INDEXES = {'default': 'mozillians',
               'public': 'mozillians-public'}
+ES_TIMEOUT = 5
 ES_INDEXING_TIMEOUT = 10
+# Options of the Elasticsearch client shared within each process, see
+# elasticsearch.Elasticsearch: connections kept alive per node and
+# sniffing of the cluster nodes.
+ES_CONNECTION_OPTIONS = {
+    'maxsize': 10,
+    'sniff_on_start': False,
+    'sniff_on_connection_fail': False,
+    'sniffer_timeout': None,
+}
+# Render search results from the indexed documents instead of fetching
+# profiles from the database. Requires a full reindex when turned on.
+ES_SOURCE_ONLY_SEARCH = False
+# Queue profile updates and index them in bulk every
+# ES_INDEX_QUEUE_INTERVAL seconds, instead of indexing on every save.
+ES_INDEX_QUEUE = False
+ES_INDEX_QUEUE_INTERVAL = 60
+# Seconds to cache the hits of searches of the search views. 0 disables
+# caching.
+ES_SEARCH_CACHE_TIMEOUT = 30
+# Radius in km of the people near here search, by default, at least and at
+# most. Profiles are located by their city, so smaller radii are meaningless.
+NEAR_DEFAULT_DISTANCE = 50
+NEAR_MIN_DISTANCE = 10
+NEAR_MAX_DISTANCE = 500
 
 # Sorl settings
 THUMBNAIL_DUMMY = True
@@ -9,6 +9,11 @@ default_app_config = 'mozillians.users.UserConfig'
 class UserConfig(AppConfig):
     name = 'mozillians.users'
 
+    def ready(self):
+        from mozillians.users.models import UserProfile
+
+        UserProfile.install_privacy_descriptors()
+
 
 AVAILABLE_LANGUAGES = {}
 REMOVE_LANGS = ['art', 'cpe', 'cpf', 'cpp', 'de_AT', 'de_CH',
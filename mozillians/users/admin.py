@@ -1,7 +1,6 @@
 from socket import error as socket_error
 
 from django import forms
-from django.conf import settings
 from django.conf.urls import patterns, url
 from django.contrib import admin
 from django.contrib import messages
@@ -73,11 +72,8 @@ def update_vouch_flags_action():
     """Update can_vouch, is_vouched flag action."""
 
     def update_vouch_flags(modeladmin, request, queryset):
-        for profile in queryset:
-            vouches_received = profile.vouches_received.count()
-            profile.can_vouch = vouches_received >= settings.CAN_VOUCH_THRESHOLD
-            profile.is_vouched = vouches_received > 0
-            profile.save()
+        ids = queryset.update_vouch_flags()
+        messages.success(request, 'Updated vouch flags of {0} profiles.'.format(len(ids)))
     update_vouch_flags.short_description = 'Update vouch flags'
     return update_vouch_flags
 
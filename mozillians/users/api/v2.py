@@ -1,8 +1,12 @@
+import json
+
 from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 import django_filters
 from rest_framework import serializers
+from rest_framework.decorators import list_route
 from rest_framework.response import Response
 
 from mozillians.api.v2.viewsets import NoCacheReadOnlyModelViewSet
@@ -10,7 +14,8 @@ from mozillians.common.templatetags.helpers import absolutify, markdown
 from mozillians.common.urlresolvers import reverse
 from mozillians.groups.models import Group, GroupMembership
 from mozillians.users.managers import PUBLIC
-from mozillians.users.models import ExternalAccount, Language, UserProfile
+from mozillians.users.models import (ExternalAccount, Language, UserProfile,
+                                     UserProfileMappingType)
 
 
 # Serializers
@@ -227,6 +232,11 @@ class UserProfileViewSet(NoCacheReadOnlyModelViewSet):
         queryset = queryset.privacy_level(privacy_level)
         return queryset
 
+    def filter_queryset(self, queryset):
+        # Listings serialize a few privacy filtered values of each
+        # profile, read them as profile views instead of instances.
+        return super(UserProfileViewSet, self).filter_queryset(queryset).views()
+
     def retrieve(self, request, pk):
         user = get_object_or_404(self.get_queryset(), pk=pk)
         group_ids = user.groupmembership_set.filter(
@@ -234,3 +244,28 @@ class UserProfileViewSet(NoCacheReadOnlyModelViewSet):
         user._groups = Group.objects.filter(id__in=group_ids)
         serializer = UserProfileDetailedSerializer(user, context={'request': self.request})
         return Response(serializer.data)
+
+    @list_route()
+    def facets(self, request):
+        """Return the facet counts of the Mozillians matching the q parameter.
+
+        Counts come from the aggregations of a single search request,
+        instead of a database query per facet.
+        """
+        public = self.request.privacy_level == PUBLIC
+        search = UserProfileMappingType.search(request.QUERY_PARAMS.get('q', u''), public=public,
+                                               include_non_vouched=True, facets=True)
+        return Response(UserProfileMappingType.get_facets(search[:0].aggregations()))
+
+    @list_route()
+    def export(self, request):
+        """Stream all Mozillians as newline delimited JSON.
+
+        Profiles are streamed from the search index while they are
+        read, with the privacy level of the API key.
+        """
+        privacy_level = self.request.privacy_level
+        profiles = UserProfileMappingType.export(privacy_level,
+                                                 public=privacy_level == PUBLIC)
+        lines = (json.dumps(profile) + '\n' for profile in profiles)
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
@@ -1,36 +1,89 @@
+import logging
+from datetime import timedelta
+
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
 
 import cronjobs
 
 from celery.task.sets import TaskSet
 from celeryutils import chunked
-from elasticutils.contrib.django import get_es
 
-from mozillians.users.tasks import index_objects
+from mozillians.users.es import get_es
+from mozillians.users.tasks import (REFRESH_NEVER, REINDEX_CHECK_DELAY, index_objects,
+                                    reindex_profiles, switch_index_alias)
 from mozillians.users.models import UserProfile, UserProfileMappingType
 
 
+logger = logging.getLogger(__name__)
+
+INDEX_WATERMARK_KEY = 'users:index_watermark'
+# How far back to look for updated profiles when there is no watermark.
+INDEX_WATERMARK_DEFAULT_AGE = timedelta(days=1)
+
+
 @cronjobs.register
 def index_all_profiles():
-    # Get an es object, delete index and re-create it
-    es = get_es(timeout=settings.ES_INDEXING_TIMEOUT)
-    mappings = {'mappings': {UserProfileMappingType.get_mapping_type_name():
-                             UserProfileMappingType.get_mapping()}}
+    """Rebuild the search indexes without search downtime.
+
+    ES_INDEXES names are aliases. Profiles are indexed into new
+    timestamped indexes, while searches keep using the live ones. The
+    aliases are switched to the new indexes once they are complete.
 
-    def _recreate_index(index):
-        es.indices.delete(index=index, ignore=[400, 404])
-        es.indices.create(index, body=mappings)
+    """
+    es = get_es()
+    # Periodic refreshing is disabled while building and restored by
+    # switch_index_alias.
+    body = {'settings': {'index': {'refresh_interval': '-1'}},
+            'mappings': {UserProfileMappingType.get_mapping_type_name():
+                         UserProfileMappingType.get_mapping()}}
+    now = timezone.now()
+    profiles = UserProfile.objects.complete().order_by('id')
+
+    for public_index in [False, True]:
+        if public_index:
+            profiles = profiles.public_indexable()
+        ids = list(profiles.values_list('id', flat=True))
+        index = '{0}-{1}'.format(UserProfileMappingType.get_index(public_index),
+                                 now.strftime('%Y%m%d%H%M%S'))
+        es.indices.create(index, body=body, request_timeout=settings.ES_INDEXING_TIMEOUT)
+
+        ts = [index_objects.subtask(args=[UserProfileMappingType, chunk, 150, public_index],
+                                    kwargs={'index': index, 'refresh': REFRESH_NEVER})
+              for chunk in chunked(ids, 150)]
+        TaskSet(ts).apply_async()
+        switch_index_alias.apply_async(args=[UserProfileMappingType, index, public_index, now],
+                                       countdown=REINDEX_CHECK_DELAY)
+
+
+@cronjobs.register
+def index_updated_profiles():
+    """Reindex profiles updated since the last run.
 
-    _recreate_index(settings.ES_INDEXES['default'])
-    _recreate_index(settings.ES_INDEXES['public'])
+    Catches up with profile updates that never made it to the search
+    indexes, e.g. due to lost index tasks, without a full rebuild.
+    Profiles count as updated when last_updated or one of their group
+    memberships changed after the watermark stored by the previous
+    run. Updated profiles that are no longer indexable are removed from
+    the indexes.
 
-    # mozillians index
-    ids = UserProfile.objects.complete().values_list('id', flat=True)
-    ts = [index_objects.subtask(args=[UserProfileMappingType, chunk, 150, False])
-          for chunk in chunked(sorted(list(ids)), 150)]
+    The watermark lives in the cache. If it was evicted, the profiles
+    updated in the last INDEX_WATERMARK_DEFAULT_AGE are reindexed and a
+    warning is logged, as older updates may have been missed.
 
-    # public index
-    ts += [index_objects.subtask(args=[UserProfileMappingType, chunk, 150, True])
-           for chunk in chunked(sorted(list(ids)), 150)]
+    """
+    now = timezone.now()
+    watermark = cache.get(INDEX_WATERMARK_KEY)
+    if watermark is None:
+        watermark = now - INDEX_WATERMARK_DEFAULT_AGE
+        logger.warning('No index watermark found, reindexing profiles updated since %s.'
+                       % watermark)
 
-    TaskSet(ts).apply_async()
+    profiles = (UserProfile.objects
+                .filter(Q(last_updated__gte=watermark) |
+                        Q(groupmembership__updated_on__gte=watermark))
+                .distinct())
+    reindex_profiles(profiles)
+    cache.set(INDEX_WATERMARK_KEY, now, timeout=None)
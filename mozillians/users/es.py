@@ -1,13 +1,149 @@
+import json
+from collections import namedtuple
+from hashlib import md5
+
 from django.conf import settings
+from django.core.cache import cache
 
 from elasticsearch import TransportError
 from elasticsearch.exceptions import NotFoundError
-from elasticutils.contrib.django import Indexable, MappingType, S, get_es
-
+from elasticsearch.helpers import bulk
+from elasticutils import get_es as base_get_es
+from elasticutils.contrib.django import Indexable, MappingType, S
+from sorl.thumbnail import get_thumbnail
+
+from mozillians.common.templatetags.helpers import absolutify, gravatar_from_digest
+from mozillians.common.urlresolvers import reverse
+from mozillians.common.utils import bump_cache_version, cache_version
 from mozillians.phonebook.templatetags.helpers import langcode_to_name
 from mozillians.users.managers import MOZILLIANS, PUBLIC
 
 ES_MAPPING_TYPE_NAME = 'user-profile'
+# Privacy controlled fields stored in the index to render search
+# results without hitting the database.
+SOURCE_FIELDS = ('full_name', 'email', 'ircname', 'photo')
+SUGGESTIONS_SIZE = 10
+# Facets of searches and the indexed fields their terms aggregations
+# count, by the FACETS_SIZE most common values.
+FACET_FIELDS = (('country', 'country_id'), ('city', 'city_id'), ('groups', 'group_ids'),
+                ('skills', 'skill_ids'), ('languages', 'language_codes'))
+FACETS_SIZE = 10
+# Facet names are cached in the versioned cache namespace of their
+# objects, see mozillians.common.utils.cache_version().
+FACET_CACHE_NAMESPACES = {'country': 'geo', 'city': 'geo', 'groups': 'groups',
+                          'skills': 'groups'}
+FACET_CACHE_TIMEOUT = 60 * 60
+# Documents read from the index per shard and scroll request of an
+# export, and how long the scroll is kept between requests.
+EXPORT_BATCH_SIZE = 500
+EXPORT_SCROLL_TIMEOUT = '5m'
+EXPORT_SOURCE_FIELDS = ['id', 'is_vouched', 'last_updated', 'display'] + \
+    ['privacy_%s' % field for field in SOURCE_FIELDS]
+
+
+def get_es(**overrides):
+    """Return the Elasticsearch client of the process.
+
+    The client is built once per process, and set of overrides, from
+    the ES_URLS, ES_TIMEOUT and ES_CONNECTION_OPTIONS settings and
+    reused by every request and task, keeping its pooled connections
+    alive in between.
+
+    """
+    options = {'urls': settings.ES_URLS,
+               'timeout': getattr(settings, 'ES_TIMEOUT', 5)}
+    options.update(getattr(settings, 'ES_CONNECTION_OPTIONS', {}))
+    options.update(overrides)
+    return base_get_es(**options)
+
+
+def invalidate_search_cache():
+    """Make all cached search results stale, e.g. after a reindex."""
+    bump_cache_version('users:search')
+
+
+SearchResultUser = namedtuple('SearchResultUser', ['username'])
+
+
+class ReadOnlyProfileBase(object):
+    """Base of read-only profiles built from stored values.
+
+    Exposes the subset of the UserProfile API used to render profiles
+    in search results and listings. Subclasses set id, user, the
+    PRIVACY_FIELDS, privacy filtered with privacy_filter(), and
+    _email_digest, None where gravatars must not stand in for the
+    photo.
+
+    """
+    __slots__ = ()
+    PRIVACY_FIELDS = SOURCE_FIELDS
+
+    @classmethod
+    def privacy_filter(cls, values, privacy_level):
+        """Return the PRIVACY_FIELDS of values privacy filtered for
+        privacy_level, using their privacy_<field> values.
+
+        """
+        from mozillians.users.models import UserProfile
+
+        privacy_fields = UserProfile.privacy_fields()
+        filtered = {}
+        for field in cls.PRIVACY_FIELDS:
+            if privacy_level and values['privacy_%s' % field] < privacy_level:
+                filtered[field] = privacy_fields[field]
+            else:
+                filtered[field] = values[field]
+        return filtered
+
+    @staticmethod
+    def is_photo_visible(values, privacy_level):
+        return not (privacy_level and values['privacy_photo'] < privacy_level)
+
+    def __unicode__(self):
+        return self.display_name
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def display_name(self):
+        return self.full_name
+
+    def get_absolute_url(self):
+        return reverse('phonebook:profile_view', args=[self.user.username])
+
+    def get_photo_url(self, geometry='160x160', **kwargs):
+        """Return photo url, following UserProfile.get_photo_url()."""
+        if 'crop' not in kwargs:
+            kwargs['crop'] = 'center'
+        if not self.photo and self._email_digest:
+            return gravatar_from_digest(self._email_digest, size=geometry)
+        photo = self.photo or settings.DEFAULT_AVATAR_PATH
+        return absolutify(get_thumbnail(photo, geometry, **kwargs).url)
+
+
+class UserProfileSearchResult(ReadOnlyProfileBase):
+    """Read-only profile built from the document stored in the index.
+
+    Fields are privacy filtered using the privacy levels indexed
+    alongside them.
+
+    """
+
+    def __init__(self, document, privacy_level=None):
+        display = dict(document['display'], **dict(
+            ('privacy_%s' % field, document['privacy_%s' % field])
+            for field in self.PRIVACY_FIELDS))
+
+        self.id = document['id']
+        self.user = SearchResultUser(username=display['username'])
+        self._privacy_level = privacy_level
+        for field, value in self.privacy_filter(display, privacy_level).items():
+            setattr(self, field, value)
+        self._email_digest = None
+        if self.is_photo_visible(display, privacy_level):
+            self._email_digest = display.get('email_digest')
 
 
 class PrivacyAwareS(S):
@@ -17,19 +153,129 @@ class PrivacyAwareS(S):
         self._privacy_level = level
         return self
 
+    def source_only(self, enabled=True):
+        """Build results from the indexed documents.
+
+        Instead of fetching UserProfiles from the database, return
+        UserProfileSearchResult objects built from the stored
+        document of each hit.
+
+        """
+        new = self._clone()
+        new._source_only = enabled
+        return new
+
+    def cached(self, enabled=True):
+        """Cache the hits of the search.
+
+        The ids of the hits, and their documents in source only mode,
+        are cached for ES_SEARCH_CACHE_TIMEOUT seconds under the body
+        and indexes of the search, including its slice. Reindexing
+        the profiles invalidates them.
+
+        """
+        new = self._clone()
+        new._cached = enabled
+        return new
+
+    def aggregate(self, **aggregations):
+        """Add raw Elasticsearch aggregations to the search.
+
+        elasticutils only supports the deprecated facets. Results of
+        the aggregations are returned by aggregations().
+
+        """
+        new = self._clone()
+        new._aggregations = dict(getattr(self, '_aggregations', None) or {}, **aggregations)
+        return new
+
+    def aggregations(self):
+        """Execute the search and return the results of its aggregations."""
+        return self._hits()[3]
+
+    def build_search(self):
+        qs = super(PrivacyAwareS, self).build_search()
+        aggregations = getattr(self, '_aggregations', None)
+        if aggregations:
+            qs['aggs'] = aggregations
+            # Top level filters only apply to the hits. Move them to a
+            # filtered query so that aggregations count the same hits.
+            if 'filter' in qs:
+                qs['query'] = {'filtered': {'query': qs.get('query', {'match_all': {}}),
+                                            'filter': qs.pop('filter')}}
+        return qs
+
+    def get_es(self, default_builder=get_es):
+        return super(PrivacyAwareS, self).get_es(default_builder=default_builder)
+
     def _clone(self, *args, **kwargs):
         new = super(PrivacyAwareS, self)._clone(*args, **kwargs)
         new._privacy_level = getattr(self, '_privacy_level', None)
+        new._source_only = getattr(self, '_source_only', False)
+        new._cached = getattr(self, '_cached', False)
+        new._aggregations = getattr(self, '_aggregations', None)
         return new
 
+    def _cache_key(self):
+        search = {'body': self.build_search(),
+                  'indexes': self.get_indexes(),
+                  'doctypes': self.get_doctypes(),
+                  'source_only': getattr(self, '_source_only', False)}
+        digest = md5(json.dumps(search, sort_keys=True, default=str)).hexdigest()
+        return 'users:search:%s:%s' % (cache_version('users:search'), digest)
+
+    def _hits(self):
+        """Return the ids, the documents and the total of the hits and
+        the results of the aggregations.
+
+        Documents are only kept in source only mode.
+
+        """
+        if getattr(self, '_hits_cache', None) is None:
+            key = self._cache_key() if getattr(self, '_cached', False) else None
+            hits = cache.get(key) if key else None
+            if hits is None:
+                results = self.execute()
+                objects = list(results)
+                sources = None
+                if getattr(self, '_source_only', False):
+                    sources = [mapped_obj.es_meta.source for mapped_obj in objects]
+                hits = ([int(mapped_obj._id) for mapped_obj in objects], sources,
+                        results.count, results.response.get('aggregations', {}))
+                if key:
+                    cache.set(key, hits, settings.ES_SEARCH_CACHE_TIMEOUT)
+            self._hits_cache = hits
+        return self._hits_cache
+
+    def count(self):
+        if getattr(self, '_cached', False):
+            return self._hits()[2]
+        return super(PrivacyAwareS, self).count()
+
     def __iter__(self):
-        self._iterator = super(PrivacyAwareS, self).__iter__()
+        """Iterate over UserProfile objects matching the search.
+
+        All the profiles of the current page are fetched from the
+        database in a single query, instead of a query per search
+        hit. Results are returned in the order Elasticsearch ranked
+        them. Hits that no longer exist in the database are skipped.
+
+        """
+        privacy_level = getattr(self, '_privacy_level', None)
+        ids, sources = self._hits()[:2]
+        if getattr(self, '_source_only', False):
+            return (UserProfileSearchResult(source, privacy_level) for source in sources)
+
+        objects = (self.type.get_model().objects
+                   .select_related('user', 'geo_country', 'geo_region', 'geo_city')
+                   .in_bulk(ids))
 
         def _generator():
-            while True:
-                mapped_obj = self._iterator.next()
-                obj = mapped_obj.get_object()
-                obj._privacy_level = getattr(self, '_privacy_level', None)
+            for id_ in ids:
+                obj = objects.get(id_)
+                if obj is None:
+                    continue
+                obj._privacy_level = privacy_level
                 yield obj
         return _generator()
 
@@ -52,8 +298,8 @@ class UserProfileMappingType(MappingType, Indexable):
         return UserProfile
 
     @classmethod
-    def get_es(cls):
-        return get_es(urls=settings.ES_URLS)
+    def get_es(cls, **overrides):
+        return get_es(**overrides)
 
     @classmethod
     def get_mapping(cls):
@@ -71,6 +317,14 @@ class UserProfileMappingType(MappingType, Indexable):
                 'city': {'type': 'string', 'analyzer': 'whitespace'},
                 'skills': {'type': 'string', 'analyzer': 'whitespace'},
                 'groups': {'type': 'string', 'analyzer': 'whitespace'},
+                'skill_ids': {'type': 'integer'},
+                'group_ids': {'type': 'integer'},
+                'timezone': {'type': 'string', 'index': 'not_analyzed'},
+                'country_id': {'type': 'integer'},
+                'city_id': {'type': 'integer'},
+                'language_codes': {'type': 'string', 'index': 'not_analyzed'},
+                'location': {'type': 'geo_point'},
+                'privacy_geo_city': {'type': 'integer'},
                 'languages': {'type': 'string', 'index': 'not_analyzed'},
                 'bio': {'type': 'string', 'analyzer': 'snowball'},
                 'is_vouched': {'type': 'boolean'},
@@ -78,7 +332,14 @@ class UserProfileMappingType(MappingType, Indexable):
                 'allows_community_sites': {'type': 'boolean'},
                 'photo': {'type': 'boolean'},
                 'last_updated': {'type': 'date'},
-                'date_joined': {'type': 'date'}
+                'date_joined': {'type': 'date'},
+                'privacy_full_name': {'type': 'integer'},
+                'privacy_email': {'type': 'integer'},
+                'privacy_ircname': {'type': 'integer'},
+                'privacy_photo': {'type': 'integer'},
+                'display': {'type': 'object', 'enabled': False},
+                'suggest': {'type': 'completion', 'analyzer': 'simple',
+                            'payloads': True}
             }
         }
 
@@ -97,10 +358,11 @@ class UserProfileMappingType(MappingType, Indexable):
                  id=id_, overwrite_existing=overwrite_existing)
 
     @classmethod
-    def refresh_index(cls, es=None, public_index=False):
+    def refresh_index(cls, es=None, public_index=False, index=None):
         if es is None:
             es = get_es()
-        index = cls.get_index(public_index)
+        if index is None:
+            index = cls.get_index(public_index)
         if es.indices.exists(index):
             es.indices.refresh(index=index)
 
@@ -116,15 +378,102 @@ class UserProfileMappingType(MappingType, Indexable):
         except TransportError, e:
             raise e
 
+    @classmethod
+    def bulk_unindex(cls, ids, es=None, public_index=False):
+        """Remove documents with ids from the index with a bulk request.
+
+        Returns the ids of the documents that failed to be removed.
+        Documents already missing from the index are not failures.
+
+        """
+        if not ids:
+            return []
+        if es is None:
+            es = get_es()
+
+        actions = [{'_op_type': 'delete',
+                    '_index': cls.get_index(public_index),
+                    '_type': cls.get_mapping_type_name(),
+                    '_id': id_} for id_ in ids]
+        errors = bulk(es, actions, chunk_size=len(actions))[1]
+        return [int(error['delete']['_id']) for error in errors
+                if error['delete'].get('status') != 404]
+
     @classmethod
     def extract_document(cls, obj_id, obj=None):
         """Extract the following fields from a document."""
 
         if obj is None:
             obj = cls.get_model().objects.get(pk=obj_id)
+
+        related = {}
+        for attribute in ['groups', 'skills']:
+            groups = []
+            group_ids = []
+            for g in getattr(obj, attribute).all():
+                groups.extend(g.aliases.values_list('name', flat=True))
+                group_ids.append(g.id)
+            related[attribute] = groups
+            related['%s_ids' % attribute[:-1]] = group_ids
+        related['languages'] = obj.languages.values_list('code', flat=True)
+        return cls._extract_document(obj, **related)
+
+    @classmethod
+    def extract_documents(cls, objs):
+        """Extract the documents of many objects at once.
+
+        Groups and skills, with their ids and aliases, and languages of
+        all objects are fetched with a query each, instead of several
+        queries per object. Objects should come with user and geo
+        fields selected.
+
+        """
+        from mozillians.groups.models import GroupMembership
+        from mozillians.users.models import Language
+
+        objs = list(objs)
+        ids = [obj.id for obj in objs]
+        related = dict((id_, {'groups': [], 'group_ids': [], 'skills': [], 'skill_ids': [],
+                              'languages': []})
+                       for id_ in ids)
+
+        queries = {
+            'group': (GroupMembership.objects.filter(userprofile__in=ids)
+                      .order_by('group__name')
+                      .values_list('userprofile', 'group', 'group__aliases__name')),
+            'skill': (cls.get_model().skills.through.objects.filter(userprofile__in=ids)
+                      .order_by('skill__name')
+                      .values_list('userprofile', 'skill', 'skill__aliases__name'))
+        }
+        for attribute, query in queries.items():
+            for id_, group_id, alias in query:
+                group_ids = related[id_]['%s_ids' % attribute]
+                if group_id not in group_ids:
+                    group_ids.append(group_id)
+                if alias is not None:
+                    related[id_]['%ss' % attribute].append(alias)
+        languages = Language.objects.filter(userprofile__in=ids).values_list('userprofile', 'code')
+        for id_, code in languages:
+            related[id_]['languages'].append(code)
+
+        documents = []
+        for obj in objs:
+            privacy_level = obj._privacy_level
+            # Respect privacy the same way related managers of a
+            # privacy aware UserProfile do.
+            for attribute in ['groups', 'group_ids', 'skills', 'skill_ids', 'languages']:
+                privacy_field = 'privacy_%s' % attribute.replace('_ids', 's')
+                if privacy_level and getattr(obj, privacy_field) < privacy_level:
+                    related[obj.id][attribute] = []
+            documents.append(cls._extract_document(obj, **related[obj.id]))
+        return documents
+
+    @classmethod
+    def _extract_document(cls, obj, groups, group_ids, skills, skill_ids, languages):
+        """Build the document of obj from its related data."""
         doc = {}
 
-        attrs = ('id', 'is_vouched', 'ircname',
+        attrs = ('id', 'is_vouched', 'ircname', 'last_updated',
                  'allows_mozilla_sites', 'allows_community_sites')
         for a in attrs:
             data = getattr(obj, a)
@@ -136,6 +485,17 @@ class UserProfileMappingType(MappingType, Indexable):
                           if obj.geo_country else None)
         doc['region'] = obj.geo_region.name.lower() if obj.geo_region else None
         doc['city'] = obj.geo_city.name.lower() if obj.geo_city else None
+        doc['country_id'] = obj.geo_country.id if obj.geo_country else None
+        doc['city_id'] = obj.geo_city.id if obj.geo_city else None
+        # The profile's own lat and lng can be as precise as a home
+        # address, so only the coordinates of its city are indexed, and
+        # only where the city is visible.
+        doc['location'] = None
+        doc['privacy_geo_city'] = obj.privacy_geo_city
+        privacy_level = getattr(obj, '_privacy_level', None)
+        city = obj.geo_city
+        if city and (not privacy_level or obj.privacy_geo_city >= privacy_level):
+            doc['location'] = {'lat': city.lat, 'lon': city.lng}
 
         # user data
         attrs = ('username', 'email', 'last_login', 'date_joined')
@@ -150,19 +510,46 @@ class UserProfileMappingType(MappingType, Indexable):
         doc.update(dict(bio=obj.bio))
         doc.update(dict(has_photo=bool(obj.photo)))
 
-        for attribute in ['groups', 'skills']:
-            groups = []
-            for g in getattr(obj, attribute).all():
-                groups.extend(g.aliases.values_list('name', flat=True))
-            doc[attribute] = groups
+        doc['groups'] = list(groups)
+        doc['skills'] = list(skills)
+        doc['group_ids'] = list(group_ids)
+        doc['skill_ids'] = list(skill_ids)
+        doc['timezone'] = obj.timezone
         # Add to search index language code, language name in English
         # native lanugage name.
-        languages = []
-        for code in obj.languages.values_list('code', flat=True):
-            languages.append(code)
-            languages.append(langcode_to_name(code, 'en_US').lower())
-            languages.append(langcode_to_name(code, code).lower())
-        doc['languages'] = list(set(languages))
+        language_names = []
+        for code in languages:
+            language_names.append(code)
+            language_names.append(langcode_to_name(code, 'en_US').lower())
+            language_names.append(langcode_to_name(code, code).lower())
+        doc['languages'] = list(set(language_names))
+        doc['language_codes'] = list(languages)
+
+        # Unmodified values and privacy levels used to render search
+        # results from the index.
+        for field in SOURCE_FIELDS:
+            doc['privacy_%s' % field] = getattr(obj, 'privacy_%s' % field)
+        # Completion suggestions for names and usernames of vouched
+        # profiles. Every word of the name completes, not only the first.
+        if obj.is_vouched:
+            names = obj.full_name.split()
+            inputs = [obj.full_name, obj.user.username] + names[1:]
+            doc['suggest'] = {'input': [name for name in inputs if name],
+                              'output': obj.user.username,
+                              'payload': {'full_name': obj.full_name}}
+        doc['display'] = {
+            'full_name': obj.full_name,
+            'username': obj.user.username,
+            'email': obj.email,
+            'ircname': obj.ircname,
+            'photo': obj.photo.name if obj.photo else '',
+            'email_digest': ''
+        }
+        # The digest of the email stands in for the photo with a
+        # gravatar, and reveals the email to guesses, so it is indexed
+        # only where the photo is visible.
+        if not privacy_level or obj.privacy_photo >= privacy_level:
+            doc['display']['email_digest'] = md5(obj.user.email).hexdigest()
         return doc
 
     @classmethod
@@ -171,8 +558,145 @@ class UserProfileMappingType(MappingType, Indexable):
         return model.objects.order_by('id').values_list('id', flat=True)
 
     @classmethod
-    def search(cls, query, include_non_vouched=False, public=False):
-        """Sensible default search for UserProfiles."""
+    def suggest(cls, term, public=False, size=SUGGESTIONS_SIZE):
+        """Return the names and usernames of vouched profiles completing term.
+
+        Uses the completion suggester instead of a search, to be fast
+        enough to run on every keystroke.
+
+        """
+        body = {'people': {'text': term.lower().strip(),
+                           'completion': {'field': 'suggest', 'size': size}}}
+        response = cls.get_es().suggest(body=body, index=cls.get_index(public))
+        return [{'username': option['text'], 'full_name': option['payload']['full_name']}
+                for option in response['people'][0]['options']]
+
+    @classmethod
+    def export(cls, privacy_level, public=False, batch_size=EXPORT_BATCH_SIZE):
+        """Yield every profile of the index as a dict, privacy filtered
+        for privacy_level.
+
+        Documents are read with a scan and scroll, a batch at a time,
+        so that exporting the whole index neither holds it in memory
+        nor pages through it with growing offsets.
+
+        """
+        es = get_es()
+        response = es.search(index=cls.get_index(public), doc_type=cls.get_mapping_type_name(),
+                             search_type='scan', scroll=EXPORT_SCROLL_TIMEOUT,
+                             size=batch_size,
+                             body={'query': {'match_all': {}},
+                                   '_source': EXPORT_SOURCE_FIELDS})
+        scroll_id = response['_scroll_id']
+        try:
+            while True:
+                response = es.scroll(scroll_id=scroll_id, scroll=EXPORT_SCROLL_TIMEOUT)
+                scroll_id = response['_scroll_id']
+                if not response['hits']['hits']:
+                    return
+                for hit in response['hits']['hits']:
+                    document = hit['_source']
+                    result = UserProfileSearchResult(document, privacy_level)
+                    yield {'id': result.id,
+                           'username': result.user.username,
+                           'full_name': result.full_name,
+                           'email': result.email,
+                           'ircname': result.ircname,
+                           'is_vouched': document['is_vouched'],
+                           'last_updated': document.get('last_updated'),
+                           'url': absolutify(result.get_absolute_url())}
+        finally:
+            # Free the scroll of exports finished or abandoned early.
+            try:
+                es.clear_scroll(scroll_id=scroll_id)
+            except NotFoundError:
+                pass
+
+    @classmethod
+    def search_near(cls, lat, lng, distance, privacy_level=MOZILLIANS,
+                    include_non_vouched=False, public=False):
+        """Search UserProfiles within distance km of lat, lng, closest first.
+
+        Only profiles whose city is visible at privacy_level are
+        matched.
+
+        """
+        search = PrivacyAwareS(cls)
+        if public:
+            privacy_level = PUBLIC
+            search = search.privacy_level(PUBLIC)
+        search = search.indexes(cls.get_index(public))
+
+        point = {'lat': lat, 'lon': lng}
+        filters = [{'geo_distance': {'distance': '%skm' % distance, 'location': point}},
+                   {'range': {'privacy_geo_city': {'gte': privacy_level}}}]
+        if not include_non_vouched:
+            filters.append({'term': {'is_vouched': True}})
+
+        return (search.filter_raw({'and': filters})
+                .order_by({'_geo_distance': {'location': point, 'order': 'asc',
+                                             'unit': 'km'}}))
+
+    @classmethod
+    def get_facets(cls, aggregations):
+        """Return the facet counts of the aggregations of a search.
+
+        Returns a dict of lists of {'id', 'name', 'count'} dicts keyed
+        by facet, most common first. Language codes are named by
+        langcode_to_name() and the other ids by get_facet_names().
+
+        """
+        facets = {}
+        for facet, field in FACET_FIELDS:
+            buckets = aggregations.get(facet, {}).get('buckets', [])
+            keys = [bucket['key'] for bucket in buckets]
+            if facet == 'languages':
+                names = dict((code, langcode_to_name(code)) for code in keys)
+            else:
+                names = cls.get_facet_names(facet, keys)
+            facets[facet] = [{'id': bucket['key'], 'name': names[bucket['key']],
+                              'count': bucket['doc_count']}
+                             for bucket in buckets if names.get(bucket['key'])]
+        return facets
+
+    @classmethod
+    def get_facet_names(cls, facet, ids):
+        """Return a dict of the names of the objects of facet with ids.
+
+        Names are cached until locations, groups or skills change, and
+        looked up with a single query for the ids missing from the
+        cache. Ids without a name to show, e.g. of invisible groups, are
+        named ''.
+
+        """
+        from mozillians.geo.models import City, Country
+        from mozillians.groups.models import Group, Skill
+
+        if not ids:
+            return {}
+        version = cache_version(FACET_CACHE_NAMESPACES[facet])
+        keys = dict(('users:facets:%s:%s:%s' % (version, facet, id_), id_) for id_ in ids)
+        names = dict((keys[key], name) for key, name in cache.get_many(keys.keys()).items())
+
+        missing = [id_ for id_ in ids if id_ not in names]
+        if missing:
+            querysets = {'country': Country.objects.all(), 'city': City.objects.all(),
+                         'groups': Group.objects.visible(), 'skills': Skill.objects.all()}
+            found = dict(querysets[facet].filter(id__in=missing).values_list('id', 'name'))
+            missing_names = dict((id_, found.get(id_, u'')) for id_ in missing)
+            cache.set_many(dict((key, missing_names[id_]) for key, id_ in keys.items()
+                                if id_ in missing_names), FACET_CACHE_TIMEOUT)
+            names.update(missing_names)
+        return names
+
+    @classmethod
+    def search(cls, query, include_non_vouched=False, public=False, facets=False):
+        """Sensible default search for UserProfiles.
+
+        With facets, the search aggregates the FACET_FIELDS of the
+        hits, to be read with get_facets(search.aggregations()).
+
+        """
         query = query.lower().strip()
         fields = ('username', 'bio__match', 'email', 'ircname',
                   'country__match', 'country__match_phrase',
@@ -201,4 +725,9 @@ class UserProfileMappingType(MappingType, Indexable):
         if not include_non_vouched:
             search = search.filter(is_vouched=True)
 
+        if facets:
+            search = search.aggregate(**dict(
+                (facet, {'terms': {'field': field, 'size': FACETS_SIZE}})
+                for facet, field in FACET_FIELDS))
+
         return search
@@ -0,0 +1,144 @@
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dateutil.parser import parse
+
+from mozillians.users.es import UserProfileMappingType, get_es
+from mozillians.users.models import UserProfile
+from mozillians.users.tasks import index_objects
+
+
+MISSING = 'missing'
+STALE = 'stale'
+ORPHANED = 'orphaned'
+SCROLL_TIMEOUT = '5m'
+
+
+def database_rows(profiles, batch_size):
+    """Yield (id, last_updated) of profiles ordered by id.
+
+    Rows are fetched in keyset batches so that only batch_size of
+    them are held in memory at any time.
+
+    """
+    last_id = 0
+    while True:
+        rows = list(profiles.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', 'last_updated')[:batch_size])
+        if not rows:
+            return
+        for row in rows:
+            yield row
+        last_id = rows[-1][0]
+
+
+def index_rows(es, index, doc_type, batch_size):
+    """Yield (id, last_updated) of the documents in index ordered by id."""
+    response = es.search(index=index, doc_type=doc_type, scroll=SCROLL_TIMEOUT,
+                         size=batch_size,
+                         body={'query': {'match_all': {}},
+                               'sort': [{'id': 'asc'}],
+                               '_source': ['last_updated']})
+    while response['hits']['hits']:
+        for hit in response['hits']['hits']:
+            last_updated = hit['_source'].get('last_updated')
+            yield int(hit['_id']), parse(last_updated) if last_updated else None
+        response = es.scroll(scroll_id=response['_scroll_id'], scroll=SCROLL_TIMEOUT)
+
+
+def compare_rows(db_rows, es_rows):
+    """Merge two streams of (id, last_updated) sorted by id.
+
+    Yields (status, id) for every profile that is missing from the
+    index, indexed with an older last_updated than the database
+    (stale) or indexed without existing in the database (orphaned).
+
+    """
+    db_row = next(db_rows, None)
+    es_row = next(es_rows, None)
+    while db_row or es_row:
+        if es_row is None or (db_row and db_row[0] < es_row[0]):
+            yield MISSING, db_row[0]
+            db_row = next(db_rows, None)
+        elif db_row is None or es_row[0] < db_row[0]:
+            yield ORPHANED, es_row[0]
+            es_row = next(es_rows, None)
+        else:
+            if es_row[1] is None or es_row[1] < db_row[1]:
+                yield STALE, db_row[0]
+            db_row = next(db_rows, None)
+            es_row = next(es_rows, None)
+
+
+class Command(BaseCommand):
+    help = 'Compare the search indexes with the database and optionally repair them.'
+
+    option_list = list(BaseCommand.option_list) + [
+        make_option('--repair',
+                    dest='repair',
+                    action='store_true',
+                    default=False,
+                    help='Reindex missing and stale profiles and remove orphaned ones.'),
+        make_option('--batch-size',
+                    dest='batch_size',
+                    type='int',
+                    default=1000,
+                    help='Number of profiles read and repaired at a time.')
+    ]
+
+    def handle(self, *args, **options):
+        if getattr(settings, 'ES_DISABLED', False):
+            raise CommandError('Elasticsearch is disabled.')
+
+        self.verbosity = int(options.get('verbosity', 1))
+
+        for public_index in [False, True]:
+            counts = self.check_index(public_index, options['batch_size'],
+                                      options['repair'])
+            self.stdout.write('%s: %d missing, %d stale, %d orphaned' %
+                              (UserProfileMappingType.get_index(public_index),
+                               counts[MISSING], counts[STALE], counts[ORPHANED]))
+
+    def check_index(self, public_index, batch_size, repair):
+        es = get_es()
+        mapping_type = UserProfileMappingType
+        profiles = UserProfile.objects.complete()
+        if public_index:
+            profiles = profiles.public_indexable()
+
+        counts = {MISSING: 0, STALE: 0, ORPHANED: 0}
+        to_index = []
+        to_unindex = []
+        differences = compare_rows(
+            database_rows(profiles, batch_size),
+            index_rows(es, mapping_type.get_index(public_index),
+                       mapping_type.get_mapping_type_name(), batch_size))
+        for status, profile_id in differences:
+            counts[status] += 1
+            if self.verbosity > 1:
+                self.stdout.write('%s %d' % (status, profile_id))
+            if not repair:
+                continue
+            if status == ORPHANED:
+                to_unindex.append(profile_id)
+            else:
+                to_index.append(profile_id)
+            if len(to_index) + len(to_unindex) >= batch_size:
+                self.repair(es, public_index, to_index, to_unindex)
+                to_index, to_unindex = [], []
+
+        if to_index or to_unindex:
+            self.repair(es, public_index, to_index, to_unindex)
+        return counts
+
+    def repair(self, es, public_index, to_index, to_unindex):
+        mapping_type = UserProfileMappingType
+        if to_index:
+            index_objects(mapping_type, to_index, public_index=public_index)
+        if to_unindex:
+            failed_ids = mapping_type.bulk_unindex(to_unindex, es=es,
+                                                   public_index=public_index)
+            if failed_ids:
+                self.stderr.write('Failed to unindex %s.' % failed_ids)
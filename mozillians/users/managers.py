@@ -1,5 +1,10 @@
-from django.db.models import Q, Manager, get_model
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import (Case, Count, F, IntegerField, Q, Manager, Value, When,
+                              get_model)
 from django.db.models.query import QuerySet, ValuesQuerySet
+from django.utils import timezone
 
 from django.utils.translation import ugettext_lazy as _lazy
 
@@ -11,6 +16,8 @@ PUBLIC = 4
 PRIVACY_CHOICES = ((MOZILLIANS, _lazy(u'Mozillians')),
                    (PUBLIC, _lazy(u'Public')))
 PUBLIC_INDEXABLE_FIELDS = ['full_name', 'ircname', 'email']
+# Prefix of the annotations masking fields in the database.
+MASKED_PREFIX = 'masked_'
 
 
 class UserProfileValuesQuerySet(ValuesQuerySet):
@@ -21,21 +28,31 @@ class UserProfileValuesQuerySet(ValuesQuerySet):
 
     E.g. .values('first_name', 'privacy_first_name')
 
+    Use UserProfileQuerySet.masked_values() to mask the fields in the
+    database instead.
+
     """
 
     def _clone(self, *args, **kwargs):
         c = super(UserProfileValuesQuerySet, self)._clone(*args, **kwargs)
         c._privacy_level = getattr(self, '_privacy_level', None)
+        c._masked_names = getattr(self, '_masked_names', {})
         return c
 
-    def iterator(self):
+    def _column_names(self):
         # Purge any extra columns that haven't been explicitly asked for
         extra_names = self.query.extra_select.keys()
         field_names = self.field_names
         aggregate_names = self.query.aggregate_select.keys()
 
-        names = extra_names + field_names + aggregate_names
+        # Annotations masking fields, and user__email for email, are
+        # named after the fields.
+        masked_names = getattr(self, '_masked_names', {})
+        return [masked_names.get(name, name)
+                for name in extra_names + field_names + aggregate_names]
 
+    def iterator(self):
+        names = self._column_names()
         model_privacy_fields = self.model.privacy_fields()
 
         privacy_fields = [
@@ -50,6 +67,23 @@ class UserProfileValuesQuerySet(ValuesQuerySet):
             yield dict(zip(names, row))
 
 
+class UserProfileViewQuerySet(UserProfileValuesQuerySet):
+    """ValuesQuerySet of UserProfileView objects.
+
+    Values are masked by the views, once, for the privacy level of
+    the query set.
+
+    """
+
+    def iterator(self):
+        from mozillians.users.models import UserProfileView
+
+        names = self._column_names()
+        privacy_level = getattr(self, '_privacy_level', None)
+        for row in self.query.get_compiler(self.db).results_iter():
+            yield UserProfileView(dict(zip(names, row)), privacy_level)
+
+
 class UserProfileQuerySet(QuerySet):
     """Custom QuerySet to support privacy."""
 
@@ -75,6 +109,74 @@ class UserProfileQuerySet(QuerySet):
         self._privacy_level = level
         return self.all()
 
+    def masked_values(self, *fields):
+        """Like values(), with privacy controlled fields masked by the database.
+
+        Privacy controlled fields, including email, are selected as
+        CASE WHEN privacy_<field> >= level THEN <field> ELSE <default>
+        END for the privacy level of the query set. Only visible values
+        are transferred and there's no need to select the privacy
+        fields. Without a privacy level it's the same as values().
+
+        """
+        privacy_level = getattr(self, '_privacy_level', None)
+        if not privacy_level:
+            c = self.values(*['user__email' if name == 'email' else name for name in fields])
+            if 'email' in fields:
+                c._masked_names = {'user__email': 'email'}
+            return c
+
+        UserProfile = get_model('users', 'UserProfile')
+        User = get_model('auth', 'User')
+        privacy_fields = UserProfile.privacy_fields()
+        if not fields:
+            fields = [field.attname for field in UserProfile._meta.concrete_fields]
+
+        names = []
+        masked_names = {}
+        annotations = {}
+        for name in fields:
+            field_name = name
+            if name.endswith('_id') and name[:-3] in privacy_fields:
+                field_name = name[:-3]
+            if field_name not in privacy_fields:
+                names.append(name)
+                continue
+
+            if field_name == 'email':
+                column, output_field = 'user__email', User._meta.get_field('email')
+            else:
+                column, output_field = name, UserProfile._meta.get_field(field_name)
+                if output_field.is_relation:
+                    output_field = IntegerField()
+            default = privacy_fields[field_name]
+            if isinstance(default, QuerySet):
+                default = None
+
+            alias = MASKED_PREFIX + name
+            annotations[alias] = Case(
+                When(then=F(column), **{'privacy_%s__gte' % field_name: privacy_level}),
+                default=Value(default), output_field=output_field)
+            masked_names[alias] = name
+            names.append(alias)
+
+        c = self.annotate(**annotations).values(*names)
+        c._masked_names = masked_names
+        return c
+
+    def views(self):
+        """Return read-only UserProfileView objects instead of profiles.
+
+        Only the values the views need are selected, and they are
+        masked once for the privacy level of the query set. For read
+        paths like listings, which don't need full model instances.
+
+        """
+        from mozillians.users.models import UserProfileView
+
+        return self._clone(klass=UserProfileViewQuerySet, setup=True,
+                           _fields=UserProfileView.VALUES)
+
     def public(self):
         """Return profiles with at least one PUBLIC field."""
         return self.filter(self.public_q)
@@ -94,6 +196,54 @@ class UserProfileQuerySet(QuerySet):
     def not_public_indexable(self):
         return self.complete().exclude(self.public_index_q)
 
+    def update_vouch_flags(self):
+        """Recompute is_vouched and can_vouch from the vouches received.
+
+        Vouches are counted for all profiles in one aggregate query and
+        the out of date profiles are updated in bulk, with one query per
+        combination of flags, instead of being saved one by one. Like
+        saving them would, the updated profiles get reindexed and their
+        Basket subscriptions updated, both in the background. Return
+        their ids.
+
+        Vouches are counted distinct, so that joins of filters applied
+        to the queryset, e.g. the admin changelist ones, don't multiply
+        them.
+
+        """
+        from mozillians.users.tasks import (reindex_profiles_task, unsubscribe_from_basket_task,
+                                            update_basket_task)
+
+        counts = (self.order_by()
+                  .annotate(vouches_count=Count('vouches_received', distinct=True))
+                  .values_list('id', 'is_vouched', 'can_vouch', 'vouches_count',
+                               'user__email', 'basket_token'))
+        updates = defaultdict(list)
+        basket_tokens = {}
+        for id_, is_vouched, can_vouch, vouches_count, email, basket_token in counts:
+            flags = (vouches_count > 0, vouches_count >= settings.CAN_VOUCH_THRESHOLD)
+            if flags != (is_vouched, can_vouch):
+                updates[flags].append(id_)
+                basket_tokens[id_] = (email, basket_token)
+
+        ids = []
+        for (is_vouched, can_vouch), flag_ids in updates.items():
+            # update() skips auto_now, set last_updated for
+            # index_updated_profiles.
+            self.model.objects.filter(id__in=flag_ids).update(
+                is_vouched=is_vouched, can_vouch=can_vouch, last_updated=timezone.now())
+            ids.extend(flag_ids)
+            # The same as the update_basket post_save receiver.
+            for id_ in flag_ids:
+                email, basket_token = basket_tokens[id_]
+                if is_vouched:
+                    update_basket_task.delay(id_)
+                elif basket_token:
+                    unsubscribe_from_basket_task.delay(email, basket_token)
+        if ids:
+            reindex_profiles_task.delay(sorted(ids))
+        return sorted(ids)
+
     def _clone(self, *args, **kwargs):
         """Custom _clone with privacy level propagation."""
         if kwargs.get('klass', None) == ValuesQuerySet:
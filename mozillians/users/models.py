@@ -2,14 +2,18 @@ import logging
 import os
 import uuid
 from datetime import datetime
+from hashlib import md5
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.mail import send_mail
 from django.db import models
 from django.db.models import signals as dbsignals, ManyToManyField
+from django.db.models.query_utils import DeferredAttribute
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.encoding import iri_to_uri
+from django.utils.functional import cached_property
 from django.utils.http import urlquote
 from django.template.loader import get_template
 
@@ -29,19 +33,33 @@ from mozillians.groups.models import (Group, GroupAlias, GroupMembership,
 from mozillians.phonebook.validators import (validate_email, validate_twitter,
                                              validate_website, validate_username_not_url,
                                              validate_phone_number)
-from mozillians.users.es import UserProfileMappingType
+from mozillians.users.es import ReadOnlyProfileBase, SearchResultUser, UserProfileMappingType
 from mozillians.users import get_languages_for_locale
 from mozillians.users.managers import (EMPLOYEES,
                                        MOZILLIANS, PRIVACY_CHOICES, PRIVILEGED,
                                        PUBLIC, PUBLIC_INDEXABLE_FIELDS,
                                        UserProfileManager, UserProfileQuerySet)
-from mozillians.users.tasks import (index_objects, unsubscribe_from_basket_task,
-                                    update_basket_task, unindex_objects)
+from mozillians.users.tasks import (index_objects, queue_index_update,
+                                    unsubscribe_from_basket_task, update_basket_task,
+                                    unindex_objects)
 
 
 COUNTRIES = product_details.get_regions('en-US')
 AVATAR_SIZE = (300, 300)
 logger = logging.getLogger(__name__)
+# Attributes of UserProfile computed by the properties privacy safing
+# them.
+PRIVACY_AWARE_PROPERTIES = {
+    'accounts': '_accounts',
+    'alternate_emails': '_alternate_emails',
+    'email': '_primary_email',
+    'is_public_indexable': '_is_public_indexable',
+    'languages': '_languages',
+    'vouches_made': '_vouches_made',
+    'vouches_received': '_vouches_received',
+    'vouched_by': '_vouched_by',
+    'websites': '_websites'
+}
 
 
 def _calculate_photo_filename(instance, filename):
@@ -58,6 +76,88 @@ class PrivacyField(models.PositiveSmallIntegerField):
         super(PrivacyField, self).__init__(*args, **myargs)
 
 
+class PrivacyAwareDescriptor(object):
+    """Descriptor of a privacy controlled field of a profile.
+
+    Returns default instead of the value of the field when the
+    privacy level of the profile is higher than the privacy of the
+    field. wrapped is the descriptor Django installed for the field,
+    if any, e.g. for relations. Otherwise the value is kept in the
+    instance dictionary, where Django keeps the values of fields.
+
+    """
+
+    def __init__(self, name, default, wrapped=None):
+        self.name = name
+        self.privacy_name = 'privacy_%s' % name
+        self.default = default
+        self.wrapped = wrapped
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self if self.wrapped is None else self.wrapped
+        privacy_level = instance._privacy_level
+        if privacy_level and getattr(instance, self.privacy_name) < privacy_level:
+            return self.default
+        if self.wrapped is not None:
+            return self.wrapped.__get__(instance, owner)
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, instance, value):
+        if self.wrapped is not None:
+            self.wrapped.__set__(instance, value)
+        else:
+            instance.__dict__[self.name] = value
+
+
+class PrivacyAwareAlias(PrivacyAwareDescriptor):
+    """Descriptor of an attribute of a profile computed by a privacy
+    aware property, e.g. email by _primary_email.
+
+    """
+
+    def __init__(self, name, target, wrapped=None):
+        super(PrivacyAwareAlias, self).__init__(name, None, wrapped)
+        self.target = target
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self if self.wrapped is None else self.wrapped
+        return getattr(instance, self.target)
+
+
+class PrivacyAwareDeferredAttribute(DeferredAttribute):
+    """Deferred attribute of a privacy controlled field of a profile.
+
+    Deferred classes, created by only() and defer(), shadow the
+    PrivacyAwareDescriptor of their deferred fields with Django's
+    DeferredAttribute. This one loads the value the same way and
+    returns default when the privacy level of the profile is higher
+    than the privacy of the field.
+
+    """
+
+    def __init__(self, field_name, model, default):
+        super(PrivacyAwareDeferredAttribute, self).__init__(field_name, model)
+        self.privacy_name = 'privacy_%s' % field_name
+        self.default = default
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        # DeferredAttribute.__get__ would read the value back through
+        # this descriptor, masked, and keep it as the value.
+        if self.field_name not in instance.__dict__:
+            instance.refresh_from_db(fields=[self.field_name])
+        privacy_level = instance._privacy_level
+        if privacy_level and getattr(instance, self.privacy_name) < privacy_level:
+            return self.default
+        return instance.__dict__[self.field_name]
+
+
 class UserProfilePrivacyModel(models.Model):
     _privacy_level = None
 
@@ -212,46 +312,42 @@ class UserProfile(UserProfilePrivacyModel):
         db_table = 'profile'
         ordering = ['full_name']
 
-    def __getattribute__(self, attrname):
-        """Special privacy aware __getattribute__ method.
-
-        This method returns the real value of the attribute of object,
-        if the privacy_level of the attribute is at least as large as
-        the _privacy_level attribute.
-
-        Otherwise it returns a default privacy respecting value for
-        the attribute, as defined in the privacy_fields dictionary.
-
-        special_functions provides methods that privacy safe their
-        respective properties, where the privacy modifications are
-        more complex.
+    @classmethod
+    def install_privacy_descriptors(cls):
+        """Install the descriptors that respect the privacy level of profiles.
+
+        Privacy controlled fields get a PrivacyAwareDescriptor which
+        returns their default value when the privacy level of the
+        profile is higher than theirs. Attributes listed in
+        PRIVACY_AWARE_PROPERTIES get a PrivacyAwareAlias to the
+        property privacy safing them, where the privacy modifications
+        are more complex. Descriptors are built once per class, so
+        accessing any other attribute costs nothing extra.
+
+        Called when the app is ready, for privacy_fields() to know
+        about reverse relations, and for every deferred class, whose
+        deferred fields get a PrivacyAwareDeferredAttribute.
         """
-        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
-        privacy_fields = UserProfile.privacy_fields()
-        privacy_level = _getattr('_privacy_level')
-        special_functions = {
-            'accounts': '_accounts',
-            'alternate_emails': '_alternate_emails',
-            'email': '_primary_email',
-            'is_public_indexable': '_is_public_indexable',
-            'languages': '_languages',
-            'vouches_made': '_vouches_made',
-            'vouches_received': '_vouches_received',
-            'vouched_by': '_vouched_by',
-            'websites': '_websites'
-        }
-
-        if attrname in special_functions:
-            return _getattr(special_functions[attrname])
-
-        if not privacy_level or attrname not in privacy_fields:
-            return _getattr(attrname)
-
-        field_privacy = _getattr('privacy_%s' % attrname)
-        if field_privacy < privacy_level:
-            return privacy_fields.get(attrname)
-
-        return _getattr(attrname)
+        if cls._deferred:
+            for name, default in cls.privacy_fields().items():
+                if type(cls.__dict__.get(name)) is DeferredAttribute:
+                    setattr(cls, name, PrivacyAwareDeferredAttribute(name, cls, default))
+            return
+
+        for name, default in cls.privacy_fields().items():
+            wrapped = cls.__dict__.get(name)
+            if name in PRIVACY_AWARE_PROPERTIES or isinstance(wrapped, PrivacyAwareDescriptor):
+                continue
+            setattr(cls, name, PrivacyAwareDescriptor(name, default, wrapped))
+        for name, target in PRIVACY_AWARE_PROPERTIES.items():
+            wrapped = cls.__dict__.get(name)
+            if isinstance(wrapped, PrivacyAwareDescriptor):
+                continue
+            setattr(cls, name, PrivacyAwareAlias(name, target, wrapped))
+
+    def _get_unfiltered(self, name):
+        """Return the value of attribute name regardless of privacy."""
+        return getattr(UserProfile, name).__get__(self, UserProfile)
 
     def _filter_accounts_privacy(self, accounts):
         if self._privacy_level:
@@ -260,15 +356,13 @@ class UserProfile(UserProfilePrivacyModel):
 
     @property
     def _accounts(self):
-        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
         excluded_types = [ExternalAccount.TYPE_WEBSITE, ExternalAccount.TYPE_EMAIL]
-        accounts = _getattr('externalaccount_set').exclude(type__in=excluded_types)
+        accounts = self.externalaccount_set.exclude(type__in=excluded_types)
         return self._filter_accounts_privacy(accounts)
 
     @property
     def _alternate_emails(self):
-        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
-        accounts = _getattr('externalaccount_set').filter(type=ExternalAccount.TYPE_EMAIL)
+        accounts = self.externalaccount_set.filter(type=ExternalAccount.TYPE_EMAIL)
         return self._filter_accounts_privacy(accounts)
 
     @property
@@ -280,19 +374,17 @@ class UserProfile(UserProfilePrivacyModel):
 
     @property
     def _languages(self):
-        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
-        if self._privacy_level > _getattr('privacy_languages'):
-            return _getattr('language_set').none()
-        return _getattr('language_set').all()
+        if self._privacy_level > self.privacy_languages:
+            return self.language_set.none()
+        return self.language_set.all()
 
     @property
     def _primary_email(self):
-        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
         privacy_fields = UserProfile.privacy_fields()
-        if self._privacy_level and _getattr('privacy_email') < self._privacy_level:
+        if self._privacy_level and self.privacy_email < self._privacy_level:
             email = privacy_fields['email']
             return email
-        return _getattr('user').email
+        return self.user.email
 
     @property
     def _vouched_by(self):
@@ -313,36 +405,31 @@ class UserProfile(UserProfilePrivacyModel):
         return None
 
     def _vouches(self, type):
-        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
-
         vouch_ids = []
-        for vouch in _getattr(type).all():
+        for vouch in self._get_unfiltered(type).all():
             vouch.vouchee.set_instance_privacy_level(self._privacy_level)
             for field in UserProfile.privacy_fields():
                 if getattr(vouch.vouchee, 'privacy_%s' % field, 0) >= self._privacy_level:
                     vouch_ids.append(vouch.id)
-        vouches = _getattr(type).filter(pk__in=vouch_ids)
+        vouches = self._get_unfiltered(type).filter(pk__in=vouch_ids)
 
         return vouches
 
     @property
     def _vouches_made(self):
-        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
         if self._privacy_level:
             return self._vouches('vouches_made')
-        return _getattr('vouches_made')
+        return self._get_unfiltered('vouches_made')
 
     @property
     def _vouches_received(self):
-        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
         if self._privacy_level:
             return self._vouches('vouches_received')
-        return _getattr('vouches_received')
+        return self._get_unfiltered('vouches_received')
 
     @property
     def _websites(self):
-        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
-        accounts = _getattr('externalaccount_set').filter(type=ExternalAccount.TYPE_WEBSITE)
+        accounts = self.externalaccount_set.filter(type=ExternalAccount.TYPE_WEBSITE)
         return self._filter_accounts_privacy(accounts)
 
     @property
@@ -351,10 +438,15 @@ class UserProfile(UserProfilePrivacyModel):
 
     @property
     def privacy_level(self):
-        """Return user privacy clearance."""
-        if (self.user.groups.filter(name='Managers').exists() or self.user.is_superuser):
+        """Return user privacy clearance.
+
+        Group memberships are looked up once per instance, e.g. once
+        per request for request.user.userprofile, see
+        clear_privacy_level_cache().
+        """
+        if self.is_manager:
             return PRIVILEGED
-        if self.groups.filter(name='staff').exists():
+        if self._is_staff:
             return EMPLOYEES
         if self.is_vouched:
             return MOZILLIANS
@@ -378,10 +470,19 @@ class UserProfile(UserProfilePrivacyModel):
                 return True
         return False
 
-    @property
+    @cached_property
     def is_manager(self):
         return self.user.is_superuser or self.user.groups.filter(name='Managers').exists()
 
+    @cached_property
+    def _is_staff(self):
+        return self.groups.filter(name='staff').exists()
+
+    def clear_privacy_level_cache(self):
+        """Look up the group memberships of privacy_level and is_manager again."""
+        for name in ['is_manager', '_is_staff']:
+            self.__dict__.pop(name, None)
+
     @property
     def date_vouched(self):
         """ Return the date of the first vouch, if available."""
@@ -615,6 +716,74 @@ class UserProfile(UserProfilePrivacyModel):
                 logger.error('Got back NONE from reverse_geocode on %s, %s' % (self.lng, self.lat))
 
 
+class UserProfileView(ReadOnlyProfileBase):
+    """Read-only view of a profile, privacy filtered once.
+
+    Built by UserProfileQuerySet.views() from the VALUES of a profile,
+    masked for the privacy level of the query set at construction, in
+    a fraction of the memory of a model instance.
+
+    """
+    VALUES = ('id', 'user__username', 'user__email', 'full_name', 'ircname', 'photo',
+              'is_vouched', 'privacy_full_name', 'privacy_email', 'privacy_ircname',
+              'privacy_photo')
+    __slots__ = ('id', 'user', 'is_vouched', '_email_digest') + ReadOnlyProfileBase.PRIVACY_FIELDS
+
+    def __init__(self, values, privacy_level=None):
+        values = dict(values, email=values['user__email'])
+        _setattr = (lambda x, y: super(UserProfileView, self).__setattr__(x, y))
+
+        _setattr('id', values['id'])
+        _setattr('user', SearchResultUser(username=values['user__username']))
+        _setattr('is_vouched', values['is_vouched'])
+        for field, value in self.privacy_filter(values, privacy_level).items():
+            _setattr(field, value)
+        email_digest = None
+        if self.is_photo_visible(values, privacy_level):
+            email_digest = md5(values['user__email']).hexdigest()
+        _setattr('_email_digest', email_digest)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is read-only' % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError('%s is read-only' % self.__class__.__name__)
+
+
+@receiver(dbsignals.class_prepared, dispatch_uid='install_deferred_privacy_descriptors_sig')
+def install_deferred_privacy_descriptors(sender, **kwargs):
+    if sender._deferred and issubclass(sender, UserProfile):
+        sender.install_privacy_descriptors()
+
+
+@receiver([dbsignals.post_save, dbsignals.post_delete], sender=GroupMembership,
+          dispatch_uid='clear_privacy_level_cache_membership_sig')
+def clear_privacy_level_cache_membership(sender, instance, **kwargs):
+    # Only the profile instance of the membership, if loaded, can have
+    # a stale cache.
+    profile = getattr(instance, GroupMembership.userprofile.cache_name, None)
+    if profile is not None:
+        profile.clear_privacy_level_cache()
+
+
+@receiver(dbsignals.post_delete, sender=GroupMembership,
+          dispatch_uid='touch_profile_membership_delete_sig')
+def touch_profile_membership_delete(sender, instance, **kwargs):
+    # A deleted membership leaves no updated_on behind, so the profile
+    # is marked updated instead, for index_updated_profiles.
+    (UserProfile.objects.filter(id=instance.userprofile_id)
+     .update(last_updated=timezone.now()))
+
+
+@receiver(dbsignals.m2m_changed, sender=User.groups.through,
+          dispatch_uid='clear_privacy_level_cache_user_groups_sig')
+def clear_privacy_level_cache_user_groups(sender, instance, **kwargs):
+    if isinstance(instance, User):
+        profile = getattr(instance, User.userprofile.cache_name, None)
+        if profile is not None:
+            profile.clear_privacy_level_cache()
+
+
 @receiver(dbsignals.post_save, sender=User,
           dispatch_uid='create_user_profile_sig')
 def create_user_profile(sender, instance, created, raw, **kwargs):
@@ -636,12 +805,17 @@ def update_basket(sender, instance, **kwargs):
 @receiver(dbsignals.post_save, sender=UserProfile,
           dispatch_uid='update_search_index_sig')
 def update_search_index(sender, instance, **kwargs):
-    if instance.is_complete:
-        index_objects.delay(UserProfileMappingType, [instance.id], public_index=False)
-        if instance.is_public_indexable:
-            index_objects.delay(UserProfileMappingType, [instance.id], public_index=True)
-        else:
-            unindex_objects.delay(UserProfileMappingType, [instance.id], public_index=True)
+    if not instance.is_complete:
+        return
+
+    if settings.ES_INDEX_QUEUE and queue_index_update(instance.id):
+        return
+
+    index_objects.delay(UserProfileMappingType, [instance.id], public_index=False)
+    if instance.is_public_indexable:
+        index_objects.delay(UserProfileMappingType, [instance.id], public_index=True)
+    else:
+        unindex_objects.delay(UserProfileMappingType, [instance.id], public_index=True)
 
 
 @receiver(dbsignals.pre_delete, sender=UserProfile,
@@ -1,18 +1,21 @@
 from datetime import datetime, timedelta
 import logging
 import os
+import time
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import send_mail
 from django.db.models import get_model
 
 import basket
 import requests
-from celery.task import task
+from celery.task import periodic_task, task
 from celery.exceptions import MaxRetriesExceededError
-from elasticutils.contrib.django import get_es
+from elasticsearch.helpers import scan
 from elasticutils.utils import chunked
 
+from mozillians.users.es import get_es, invalidate_search_cache
 from mozillians.users.managers import PUBLIC
 
 
@@ -25,6 +28,22 @@ BASKET_NEWSLETTER = getattr(settings, 'BASKET_NEWSLETTER', False)
 BASKET_API_KEY = os.environ.get('BASKET_API_KEY', getattr(settings, 'BASKET_API_KEY', False))
 BASKET_ENABLED = all([BASKET_URL, BASKET_NEWSLETTER, BASKET_API_KEY])
 INCOMPLETE_ACC_MAX_DAYS = 7
+REINDEX_CHECK_DELAY = 60  # 1 minute
+REINDEX_CHECK_MAX_RETRIES = 60  # Wait at most 1 hour for the new index
+REFRESH_PER_CHUNK = 'chunk'
+REFRESH_AT_END = 'end'
+REFRESH_NEVER = 'never'
+DEFAULT_REFRESH_INTERVAL = '1s'
+INDEX_QUEUE_KEY = 'users:index_queue'
+INDEX_QUEUE_HEAD_KEY = 'users:index_queue:head'
+INDEX_QUEUE_TAIL_KEY = 'users:index_queue:tail'
+INDEX_QUEUE_ITEM_TIMEOUT = 60 * 60 * 24
+INDEX_QUEUE_LOCK_KEY = 'users:index_queue:lock'
+INDEX_QUEUE_LOCK_TIMEOUT = 10
+INDEX_QUEUE_LOCK_ATTEMPTS = 50
+INDEX_QUEUE_LOCK_DELAY = 0.01
+# Queue positions read from the cache per request of a flush.
+INDEX_QUEUE_FLUSH_CHUNK = 500
 
 
 def _email_basket_managers(action, email, error_message):
@@ -218,25 +237,40 @@ def unsubscribe_from_basket_task(email, basket_token):
 
 
 @task
-def index_objects(mapping_type, ids, chunk_size=100, public_index=False, **kwargs):
+def index_objects(mapping_type, ids, chunk_size=100, public_index=False, index=None,
+                  refresh=REFRESH_AT_END, **kwargs):
+    """Index objects with ids in the search index.
+
+    Documents are written to the index of the mapping type, unless
+    another (e.g. a new index being built) is passed as `index`.
+
+    `refresh` sets when the index gets refreshed to make the documents
+    searchable: after every chunk (REFRESH_PER_CHUNK), once at the end
+    of the task (REFRESH_AT_END) or never (REFRESH_NEVER), leaving it
+    to Elasticsearch's refresh_interval.
+
+    """
     if getattr(settings, 'ES_DISABLED', False):
         return
 
     es = get_es()
     model = mapping_type.get_model()
+    if index is None:
+        index = mapping_type.get_index(public_index)
 
     for id_list in chunked(ids, chunk_size):
-        documents = []
-        qs = model.objects.filter(id__in=id_list)
-        index = mapping_type.get_index(public_index)
+        qs = (model.objects.filter(id__in=id_list)
+              .select_related('user', 'geo_country', 'geo_region', 'geo_city'))
         if public_index:
             qs = qs.public_indexable().privacy_level(PUBLIC)
 
-        for item in qs:
-            documents.append(mapping_type.extract_document(item.id, item))
-
+        documents = mapping_type.extract_documents(qs)
         mapping_type.bulk_index(documents, id_field='id', es=es, index=index)
-        mapping_type.refresh_index(es)
+        if refresh == REFRESH_PER_CHUNK:
+            mapping_type.refresh_index(es, index=index)
+
+    if refresh == REFRESH_AT_END:
+        mapping_type.refresh_index(es, index=index)
 
 
 @task
@@ -245,8 +279,216 @@ def unindex_objects(mapping_type, ids, public_index, **kwargs):
         return
 
     es = get_es()
-    for id_ in ids:
-        mapping_type.unindex(id_, es=es, public_index=public_index)
+    failed_ids = mapping_type.bulk_unindex(ids, es=es, public_index=public_index)
+    if failed_ids:
+        logger.error('Failed to unindex %s from %s.' %
+                     (failed_ids, mapping_type.get_index(public_index)))
+
+
+@task(default_retry_delay=REINDEX_CHECK_DELAY, max_retries=REINDEX_CHECK_MAX_RETRIES)
+def switch_index_alias(mapping_type, index, public_index, since):
+    """Point the search alias of mapping_type to a newly built index.
+
+    The build of `index` started at `since`. The task waits, retrying,
+    until `index` holds at least as many documents as there are
+    indexable profiles not updated since then, which the build must
+    have indexed. It then atomically moves the alias from the live
+    index to `index` and drops the old index. Updates went to the old
+    index while the new one was being built, so the profiles updated
+    after `since` are reindexed, and the documents of profiles deleted
+    or no longer indexable in the meantime are unindexed. If the new
+    index never completes, it is dropped and the live index is left
+    untouched.
+
+    Periodic refreshing of `index`, disabled while building it, is
+    restored before the switch.
+
+    """
+    if getattr(settings, 'ES_DISABLED', False):
+        return
+
+    es = get_es()
+    model = mapping_type.get_model()
+    alias = mapping_type.get_index(public_index)
+    profiles = model.objects.complete()
+    if public_index:
+        profiles = profiles.public_indexable()
+    doc_type = mapping_type.get_mapping_type_name()
+
+    es.indices.refresh(index=index)
+    indexed = es.count(index=index, doc_type=doc_type)['count']
+    if indexed < profiles.filter(last_updated__lt=since).count():
+        try:
+            switch_index_alias.retry()
+        except MaxRetriesExceededError:
+            logger.error('Index %s is incomplete, keeping %s as is.' % (index, alias))
+            es.indices.delete(index=index, ignore=404)
+        return
+
+    es.indices.put_settings(index=index,
+                            body={'index': {'refresh_interval': DEFAULT_REFRESH_INTERVAL}})
+
+    actions = [{'add': {'index': index, 'alias': alias}}]
+    old_indexes = []
+    if es.indices.exists_alias(name=alias):
+        old_indexes = es.indices.get_alias(name=alias).keys()
+        actions = [{'remove': {'index': old_index, 'alias': alias}}
+                   for old_index in old_indexes] + actions
+    elif es.indices.exists(index=alias):
+        # An index named after the alias, built before aliases were
+        # used, must go away before the alias can be created.
+        es.indices.delete(index=alias)
+    es.indices.update_aliases(body={'actions': actions})
+    invalidate_search_cache()
+
+    for old_index in old_indexes:
+        if old_index != index:
+            es.indices.delete(index=old_index, ignore=404)
+
+    updated_ids = list(profiles.filter(last_updated__gte=since).values_list('id', flat=True))
+    if updated_ids:
+        index_objects.delay(mapping_type, updated_ids, public_index=public_index)
+    indexed_ids = set(int(hit['_id']) for hit in
+                      scan(es, query={'fields': []}, index=index, doc_type=doc_type))
+    stale_ids = sorted(indexed_ids - set(profiles.values_list('id', flat=True)))
+    if stale_ids:
+        unindex_objects.delay(mapping_type, stale_ids, public_index=public_index)
+
+
+def _lock_index_queue():
+    """Take the lock of the index queue, waiting for it briefly.
+
+    Return whether the lock was taken. It expires on its own, in case
+    its holder dies before releasing it with _unlock_index_queue().
+
+    """
+    for attempt in range(INDEX_QUEUE_LOCK_ATTEMPTS):
+        if cache.add(INDEX_QUEUE_LOCK_KEY, 1, INDEX_QUEUE_LOCK_TIMEOUT):
+            return True
+        time.sleep(INDEX_QUEUE_LOCK_DELAY)
+    return False
+
+
+def _unlock_index_queue():
+    cache.delete(INDEX_QUEUE_LOCK_KEY)
+
+
+def queue_index_update(profile_id):
+    """Queue profile for indexing by the next flush_index_queue run.
+
+    The queue lives in the cache. Every entry is stored under its own
+    key, numbered by an atomically incremented tail counter. The tail
+    is incremented and the entry stored under the queue lock, so that
+    flushes never see a position before its entry.
+
+    Return False if the lock could not be taken and the profile was not
+    queued.
+
+    """
+    if not _lock_index_queue():
+        return False
+    try:
+        try:
+            position = cache.incr(INDEX_QUEUE_TAIL_KEY)
+        except ValueError:
+            # Continue after the flushed positions, so that they are
+            # not reused.
+            cache.add(INDEX_QUEUE_TAIL_KEY, cache.get(INDEX_QUEUE_HEAD_KEY, 0), timeout=None)
+            position = cache.incr(INDEX_QUEUE_TAIL_KEY)
+        cache.set('{0}:{1}'.format(INDEX_QUEUE_KEY, position), profile_id,
+                  timeout=INDEX_QUEUE_ITEM_TIMEOUT)
+    finally:
+        _unlock_index_queue()
+    return True
+
+
+@periodic_task(run_every=timedelta(seconds=settings.ES_INDEX_QUEUE_INTERVAL))
+def flush_index_queue():
+    """Index the profiles queued since the last run.
+
+    A profile saved many times within the interval is indexed once,
+    in bulk with a single refresh per index. The head counter moves
+    past the flushed positions once they are indexed. Entries missing
+    up to the tail expired or got evicted, as entries are stored before
+    the tail moves past them.
+
+    """
+    if getattr(settings, 'ES_DISABLED', False) or not settings.ES_INDEX_QUEUE:
+        return
+
+    # Avoid circular dependencies
+    from mozillians.users.models import UserProfile
+
+    if not _lock_index_queue():
+        # Try again next run.
+        return
+    try:
+        tail = cache.get(INDEX_QUEUE_TAIL_KEY, 0)
+    finally:
+        _unlock_index_queue()
+    head = cache.get(INDEX_QUEUE_HEAD_KEY, 0)
+    if tail < head:
+        # The counters were evicted and started over.
+        head = 0
+    if tail == head:
+        return
+
+    keys = ['{0}:{1}'.format(INDEX_QUEUE_KEY, position) for position in range(head + 1, tail + 1)]
+    ids = set()
+    for chunk in chunked(keys, INDEX_QUEUE_FLUSH_CHUNK):
+        ids.update(cache.get_many(chunk).values())
+
+    reindex_profiles(UserProfile.objects.filter(id__in=ids))
+    cache.set(INDEX_QUEUE_HEAD_KEY, tail, timeout=None)
+    for chunk in chunked(keys, INDEX_QUEUE_FLUSH_CHUNK):
+        cache.delete_many(chunk)
+
+
+def reindex_profiles(profiles):
+    """Bring the search indexes up to date for profiles.
+
+    Complete profiles are indexed in bulk, with a single refresh per
+    index. Public indexable profiles are indexed in the public index
+    too, while the rest get removed from it. Profiles that are no longer
+    complete are removed from both indexes.
+
+    """
+    from mozillians.users.models import UserProfileMappingType
+
+    ids = set(profiles.values_list('id', flat=True))
+    if not ids:
+        return
+    profiles = profiles.complete().order_by('id')
+    complete_ids = list(profiles.values_list('id', flat=True))
+    public_ids = list(profiles.public_indexable().values_list('id', flat=True))
+    incomplete_ids = sorted(ids - set(complete_ids))
+    non_public_ids = sorted(ids - set(public_ids))
+
+    if complete_ids:
+        index_objects(UserProfileMappingType, complete_ids, public_index=False)
+    if incomplete_ids:
+        unindex_objects(UserProfileMappingType, incomplete_ids, public_index=False)
+    if public_ids:
+        index_objects(UserProfileMappingType, public_ids, public_index=True)
+    if non_public_ids:
+        unindex_objects(UserProfileMappingType, non_public_ids, public_index=True)
+
+
+@task
+def reindex_profiles_task(ids):
+    """Bring the search indexes up to date for the profiles with ids."""
+    from mozillians.users.models import UserProfile
+
+    reindex_profiles(UserProfile.objects.filter(id__in=ids))
+
+
+@periodic_task(run_every=timedelta(hours=24))
+def update_vouch_flags():
+    """Fix the vouch flags of profiles that went out of sync with their vouches."""
+    # Avoid circular dependencies
+    from mozillians.users.models import UserProfile
+
+    UserProfile.objects.all().update_vouch_flags()
 
 
 @task
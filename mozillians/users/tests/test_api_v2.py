@@ -10,7 +10,8 @@ from mozillians.geo.tests import CityFactory, CountryFactory, RegionFactory
 from mozillians.groups.models import Group
 from mozillians.groups.tests import GroupFactory
 from mozillians.users.managers import MOZILLIANS, PUBLIC
-from mozillians.users.models import GroupMembership, ExternalAccount, Language, UserProfile
+from mozillians.users.models import (GroupMembership, ExternalAccount, Language, UserProfile,
+                                     UserProfileView)
 from mozillians.users.tests import UserFactory
 from mozillians.users.api.v2 import (ExternalAccountSerializer,
                                      LanguageSerializer,
@@ -178,6 +179,19 @@ class UserProfileViewSetTests(TestCase):
         ok_(userprofile_mock.objects.complete.called)
         userprofile_mock.objects.complete().privacy_level.assert_called_with(MOZILLIANS)
 
+    def test_filter_queryset_views(self):
+        user = UserFactory.create()
+        viewset = UserProfileViewSet()
+        viewset.request = Mock()
+        viewset.request.privacy_level = PUBLIC
+        viewset.request.QUERY_PARAMS = {}
+        with patch('mozillians.api.v2.viewsets.NoCacheReadOnlyModelViewSet.filter_queryset',
+                   side_effect=lambda queryset: queryset):
+            queryset = viewset.filter_queryset(UserProfile.objects.privacy_level(PUBLIC))
+        views = list(queryset)
+        eq_([view.id for view in views], [user.userprofile.id])
+        ok_(isinstance(views[0], UserProfileView))
+
     def test_retrieve_base(self):
         viewset = UserProfileViewSet()
         viewset.request = Mock()
@@ -194,6 +208,34 @@ class UserProfileViewSetTests(TestCase):
         viewset.request.privacy_level = MOZILLIANS
         self.assertRaises(Http404, viewset.retrieve, viewset.request, -1)
 
+    @patch('mozillians.users.api.v2.UserProfileMappingType')
+    def test_facets(self, mapping_type_mock):
+        viewset = UserProfileViewSet()
+        viewset.request = Mock()
+        viewset.request.privacy_level = PUBLIC
+        viewset.request.QUERY_PARAMS = {'q': 'foo'}
+        mapping_type_mock.get_facets.return_value = {'groups': []}
+        response = viewset.facets(viewset.request)
+
+        mapping_type_mock.search.assert_called_with('foo', public=True,
+                                                    include_non_vouched=True, facets=True)
+        search = mapping_type_mock.search().__getitem__
+        search.assert_called_with(slice(None, 0))
+        mapping_type_mock.get_facets.assert_called_with(search().aggregations())
+        eq_(response.data, {'groups': []})
+
+    @patch('mozillians.users.api.v2.UserProfileMappingType')
+    def test_export(self, mapping_type_mock):
+        viewset = UserProfileViewSet()
+        viewset.request = Mock()
+        viewset.request.privacy_level = MOZILLIANS
+        mapping_type_mock.export.return_value = iter([{'id': 1}, {'id': 2}])
+        response = viewset.export(viewset.request)
+
+        eq_(response['Content-Type'], 'application/x-ndjson')
+        eq_(''.join(response.streaming_content), '{"id": 1}\n{"id": 2}\n')
+        mapping_type_mock.export.assert_called_with(MOZILLIANS, public=False)
+
 
 class UserProfileFilterTest(TestCase):
     def setUp(self):
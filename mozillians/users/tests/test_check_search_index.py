@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from django.utils.timezone import make_aware
+
+import pytz
+from mock import Mock, patch
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.users.es import UserProfileMappingType
+from mozillians.users.management.commands.check_search_index import (
+    MISSING, ORPHANED, STALE, Command, compare_rows, database_rows)
+from mozillians.users.models import UserProfile
+from mozillians.users.tests import UserFactory
+
+
+class CheckSearchIndexTests(TestCase):
+    def test_compare_rows(self):
+        old = make_aware(datetime(2012, 1, 1), pytz.UTC)
+        new = make_aware(datetime(2014, 1, 1), pytz.UTC)
+        db_rows = iter([(1, new), (2, new), (3, new), (5, new)])
+        es_rows = iter([(2, new), (3, old), (4, new), (5, None), (6, new)])
+        eq_(list(compare_rows(db_rows, es_rows)),
+            [(MISSING, 1), (STALE, 3), (ORPHANED, 4), (STALE, 5), (ORPHANED, 6)])
+
+    def test_database_rows(self):
+        user_1 = UserFactory.create()
+        user_2 = UserFactory.create()
+        user_3 = UserFactory.create()
+        rows = database_rows(UserProfile.objects.all(), batch_size=2)
+        eq_([row[0] for row in rows],
+            [user_1.userprofile.id, user_2.userprofile.id, user_3.userprofile.id])
+
+    @patch('mozillians.users.management.commands.check_search_index.get_es')
+    @patch('mozillians.users.management.commands.check_search_index.index_objects')
+    @patch('mozillians.users.management.commands.check_search_index.index_rows')
+    def test_repair(self, index_rows_mock, index_objects_mock, get_es_mock):
+        user = UserFactory.create()
+        index_rows_mock.return_value = iter([(user.userprofile.id + 1, None)])
+        command = Command()
+        command.verbosity = 1
+
+        with patch.object(UserProfileMappingType, 'bulk_unindex') as bulk_unindex_mock:
+            bulk_unindex_mock.return_value = []
+            counts = command.check_index(False, batch_size=10, repair=True)
+
+        eq_(counts, {MISSING: 1, STALE: 0, ORPHANED: 1})
+        index_objects_mock.assert_called_with(UserProfileMappingType, [user.userprofile.id],
+                                              public_index=False)
+        bulk_unindex_mock.assert_called_with([user.userprofile.id + 1],
+                                             es=get_es_mock(), public_index=False)
+
+    @patch('mozillians.users.management.commands.check_search_index.get_es')
+    @patch('mozillians.users.management.commands.check_search_index.index_objects')
+    @patch('mozillians.users.management.commands.check_search_index.index_rows')
+    def test_check_without_repair(self, index_rows_mock, index_objects_mock, get_es_mock):
+        UserFactory.create()
+        index_rows_mock.return_value = iter([])
+        command = Command()
+        command.verbosity = 1
+        command.repair = Mock()
+
+        counts = command.check_index(False, batch_size=10, repair=False)
+        eq_(counts, {MISSING: 1, STALE: 0, ORPHANED: 0})
+        ok_(not command.repair.called)
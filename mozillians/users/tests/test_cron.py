@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+from django.utils.timezone import make_aware
+
+import pytz
+from mock import call, patch
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.users.cron import (INDEX_WATERMARK_KEY, index_all_profiles,
+                                   index_updated_profiles)
+from mozillians.groups.tests import GroupFactory
+from mozillians.users.managers import PUBLIC
+from mozillians.users.models import UserProfile, UserProfileMappingType
+from mozillians.users.tests import UserFactory
+
+
+class IndexAllProfilesTests(TestCase):
+    @patch('mozillians.users.cron.switch_index_alias.apply_async')
+    @patch('mozillians.users.cron.TaskSet')
+    @patch('mozillians.users.cron.index_objects.subtask')
+    @patch('mozillians.users.cron.get_es')
+    def test_index_all_profiles(self, get_es_mock, subtask_mock, taskset_mock,
+                                switch_index_alias_mock):
+        public = UserFactory.create(userprofile={'privacy_full_name': PUBLIC}).userprofile
+        profile = UserFactory.create().userprofile
+        UserFactory.create(userprofile={'full_name': ''})
+
+        index_all_profiles()
+        ids = [public.id, profile.id]
+        eq_([call[1]['args'][1] for call in subtask_mock.call_args_list], [ids, [public.id]])
+        eq_([call[1]['args'][2] for call in switch_index_alias_mock.call_args_list],
+            [False, True])
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class IndexUpdatedProfilesTests(TestCase):
+    @patch('mozillians.users.cron.reindex_profiles')
+    def test_index_updated_profiles(self, reindex_profiles_mock):
+        old_date = make_aware(datetime(2010, 1, 1), pytz.UTC)
+        watermark = make_aware(datetime(2012, 1, 1), pytz.UTC)
+        updated = UserFactory.create()
+        not_updated = UserFactory.create()
+        UserProfile.objects.filter(id=not_updated.userprofile.id).update(last_updated=old_date)
+        cache.set(INDEX_WATERMARK_KEY, watermark)
+
+        index_updated_profiles()
+        profiles = reindex_profiles_mock.call_args[0][0]
+        eq_(list(profiles), [updated.userprofile])
+        ok_(cache.get(INDEX_WATERMARK_KEY) > watermark)
+
+    @patch('mozillians.users.cron.logger')
+    @patch('mozillians.users.cron.reindex_profiles')
+    def test_index_updated_profiles_without_watermark(self, reindex_profiles_mock, logger_mock):
+        old_date = make_aware(datetime.now() - timedelta(days=10), pytz.UTC)
+        user = UserFactory.create()
+        UserProfile.objects.filter(id=user.userprofile.id).update(last_updated=old_date)
+
+        index_updated_profiles()
+        profiles = reindex_profiles_mock.call_args[0][0]
+        eq_(list(profiles), [])
+        ok_(logger_mock.warning.called)
+
+    @patch('mozillians.users.cron.reindex_profiles')
+    def test_index_updated_profiles_lost_membership(self, reindex_profiles_mock):
+        old_date = make_aware(datetime(2010, 1, 1), pytz.UTC)
+        group = GroupFactory.create()
+        user = UserFactory.create()
+        group.add_member(user.userprofile)
+        UserProfile.objects.filter(id=user.userprofile.id).update(last_updated=old_date)
+        cache.set(INDEX_WATERMARK_KEY, make_aware(datetime(2012, 1, 1), pytz.UTC))
+        group.remove_member(user.userprofile, send_email=False)
+
+        index_updated_profiles()
+        profiles = reindex_profiles_mock.call_args[0][0]
+        eq_(list(profiles), [user.userprofile])
+
+    @patch('mozillians.users.tasks.unindex_objects')
+    @patch('mozillians.users.tasks.index_objects')
+    def test_index_updated_profiles_incomplete(self, index_objects_mock, unindex_objects_mock):
+        cache.set(INDEX_WATERMARK_KEY, make_aware(datetime(2012, 1, 1), pytz.UTC))
+        profile = UserFactory.create().userprofile
+        UserProfile.objects.filter(id=profile.id).update(full_name='')
+
+        index_updated_profiles()
+        ok_(not index_objects_mock.called)
+        unindex_objects_mock.assert_has_calls([
+            call(UserProfileMappingType, [profile.id], public_index=False),
+            call(UserProfileMappingType, [profile.id], public_index=True)])
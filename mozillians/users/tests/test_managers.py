@@ -1,9 +1,12 @@
+from django.test.utils import override_settings
+from django.utils.timezone import now
+
 from mock import patch
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 
 from mozillians.common.tests import TestCase
-from mozillians.users.managers import PUBLIC
-from mozillians.users.models import UserProfile
+from mozillians.users.managers import MOZILLIANS, PUBLIC
+from mozillians.users.models import ExternalAccount, UserProfile, UserProfileView
 from mozillians.users.tests import UserFactory
 
 
@@ -76,3 +79,118 @@ class UserProfileQuerySetTests(TestCase):
         queryset = UserProfile.objects.all()
         queryset.privacy_level(99)
         eq_(queryset.all()[0]._privacy_level, 99)
+
+    def test_views(self):
+        user = UserFactory.create(userprofile={'privacy_full_name': PUBLIC,
+                                               'privacy_ircname': MOZILLIANS,
+                                               'ircname': 'foo'})
+        UserFactory.create()
+        queryset = UserProfile.objects.filter(id=user.userprofile.id).privacy_level(PUBLIC)
+        with self.assertNumQueries(1):
+            views = list(queryset.views())
+        eq_(len(views), 1)
+        ok_(isinstance(views[0], UserProfileView))
+        eq_(views[0].id, user.userprofile.id)
+        eq_(views[0].user.username, user.username)
+        eq_(views[0].full_name, user.userprofile.full_name)
+        eq_(views[0].ircname, '')
+        eq_(views[0].email, '')
+
+        views = UserProfile.objects.filter(id=user.userprofile.id).views()
+        eq_(views[0].ircname, 'foo')
+        eq_(views[0].email, user.email)
+
+    def test_views_paginate(self):
+        UserFactory.create()
+        UserFactory.create()
+        views = UserProfile.objects.privacy_level(PUBLIC).order_by('id').views()
+        eq_(views.count(), 2)
+        eq_(len(views[1:]), 1)
+        eq_(views.filter(is_vouched=True).count(), 2)
+
+    def test_masked_values(self):
+        user = UserFactory.create(userprofile={'privacy_full_name': PUBLIC,
+                                               'privacy_ircname': MOZILLIANS,
+                                               'privacy_geo_country': MOZILLIANS,
+                                               'ircname': 'foo'})
+        queryset = (UserProfile.objects.filter(id=user.userprofile.id).privacy_level(PUBLIC)
+                    .masked_values('id', 'full_name', 'ircname', 'email', 'geo_country'))
+        ok_('CASE WHEN' in str(queryset.query))
+        eq_(list(queryset), [{'id': user.userprofile.id, 'full_name': user.userprofile.full_name,
+                              'ircname': '', 'email': '', 'geo_country': None}])
+
+        queryset = (UserProfile.objects.filter(id=user.userprofile.id)
+                    .privacy_level(MOZILLIANS).masked_values('ircname', 'email', 'geo_country'))
+        eq_(queryset[0], {'ircname': 'foo', 'email': user.email,
+                          'geo_country': user.userprofile.geo_country_id})
+
+    def test_masked_values_all_fields(self):
+        user = UserFactory.create(userprofile={'privacy_bio': MOZILLIANS, 'bio': 'foo',
+                                               'privacy_geo_city': MOZILLIANS})
+        values = UserProfile.objects.privacy_level(PUBLIC).masked_values()[0]
+        eq_(values['id'], user.userprofile.id)
+        eq_(values['bio'], '')
+        eq_(values['geo_city_id'], None)
+        eq_(values['is_vouched'], True)
+
+    def test_masked_values_without_privacy_level(self):
+        user = UserFactory.create(userprofile={'ircname': 'foo'})
+        queryset = UserProfile.objects.masked_values('ircname')
+        ok_('CASE WHEN' not in str(queryset.query))
+        eq_(queryset.get(id=user.userprofile.id), {'ircname': 'foo'})
+
+        queryset = UserProfile.objects.masked_values('id', 'email')
+        eq_(queryset.get(id=user.userprofile.id), {'id': user.userprofile.id,
+                                                   'email': user.email})
+
+    @override_settings(CAN_VOUCH_THRESHOLD=2)
+    @patch('mozillians.users.tasks.unsubscribe_from_basket_task.delay')
+    @patch('mozillians.users.tasks.update_basket_task.delay')
+    @patch('mozillians.users.tasks.reindex_profiles_task.delay')
+    def test_update_vouch_flags(self, reindex_profiles_mock, update_basket_mock,
+                                unsubscribe_mock):
+        in_sync = UserFactory.create().userprofile
+        not_vouched = UserFactory.create().userprofile
+        can_vouch = UserFactory.create().userprofile
+        # Vouch changes update the flags, so they are put out of sync
+        # afterwards.
+        can_vouch.vouches_received.create(voucher=in_sync, date=now())
+        UserProfile.objects.filter(id=can_vouch.id).update(can_vouch=False)
+        not_vouched.vouches_received.all().delete()
+        UserProfile.objects.filter(id=not_vouched.id).update(is_vouched=True,
+                                                             basket_token='token')
+        update_basket_mock.reset_mock()
+        unsubscribe_mock.reset_mock()
+
+        with self.assertNumQueries(3):
+            ids = UserProfile.objects.all().update_vouch_flags()
+        eq_(ids, sorted([not_vouched.id, can_vouch.id]))
+        reindex_profiles_mock.assert_called_once_with(ids)
+        update_basket_mock.assert_called_once_with(can_vouch.id)
+        unsubscribe_mock.assert_called_once_with(not_vouched.email, 'token')
+        eq_(UserProfile.objects.values_list('is_vouched', 'can_vouch').get(id=not_vouched.id),
+            (False, False))
+        eq_(UserProfile.objects.values_list('is_vouched', 'can_vouch').get(id=can_vouch.id),
+            (True, True))
+        eq_(UserProfile.objects.values_list('is_vouched', 'can_vouch').get(id=in_sync.id),
+            (True, False))
+
+    @patch('mozillians.users.tasks.reindex_profiles_task.delay')
+    def test_update_vouch_flags_in_sync(self, reindex_profiles_mock):
+        UserFactory.create()
+        with self.assertNumQueries(1):
+            eq_(UserProfile.objects.all().update_vouch_flags(), [])
+        ok_(not reindex_profiles_mock.called)
+
+    @override_settings(CAN_VOUCH_THRESHOLD=2)
+    @patch('mozillians.users.tasks.reindex_profiles_task.delay')
+    def test_update_vouch_flags_joined_filter(self, reindex_profiles_mock):
+        profile = UserFactory.create().userprofile
+        for identifier in ('foo', 'bar'):
+            profile.externalaccount_set.create(type=ExternalAccount.TYPE_SUMO,
+                                               identifier=identifier)
+        queryset = UserProfile.objects.filter(externalaccount__type=ExternalAccount.TYPE_SUMO)
+        eq_(queryset.update_vouch_flags(), [])
+        ok_(not reindex_profiles_mock.called)
+        eq_(UserProfile.objects.values_list('is_vouched', 'can_vouch').get(id=profile.id),
+            (True, False))
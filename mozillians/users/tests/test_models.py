@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
+from hashlib import md5
 from uuid import uuid4
 
 from django.conf import settings
-from django.contrib.auth.models import User
+from django.contrib.auth.models import Group as AuthGroup, User
 from django.core.urlresolvers import reverse
 from django.db.models.query import QuerySet
 from django.test.utils import override_settings
@@ -12,16 +13,21 @@ from django.utils.timezone import make_aware
 
 import basket
 import pytz
-from mock import Mock, call, patch
+from mock import MagicMock, Mock, call, patch
 from nose.tools import eq_, ok_
 
 from mozillians.common.tests import TestCase
 from mozillians.groups.models import Group, Skill
 from mozillians.groups.tests import (GroupAliasFactory, GroupFactory,
                                      SkillAliasFactory, SkillFactory)
-from mozillians.users.managers import (EMPLOYEES, MOZILLIANS, PUBLIC, PUBLIC_INDEXABLE_FIELDS)
-from mozillians.users.models import ExternalAccount, UserProfile, _calculate_photo_filename, Vouch
-from mozillians.users.es import PrivacyAwareS, UserProfileMappingType
+from mozillians.users.managers import (EMPLOYEES, MOZILLIANS, PRIVILEGED, PUBLIC,
+                                       PUBLIC_INDEXABLE_FIELDS)
+from mozillians.users.models import (ExternalAccount, PrivacyAwareAlias,
+                                     PrivacyAwareDeferredAttribute, PrivacyAwareDescriptor,
+                                     UserProfile, UserProfileView, _calculate_photo_filename,
+                                     Vouch)
+from mozillians.users.es import (PrivacyAwareS, UserProfileMappingType,
+                                 UserProfileSearchResult, get_es, invalidate_search_cache)
 from mozillians.users.tests import LanguageFactory, UserFactory
 
 
@@ -200,6 +206,46 @@ class UserProfileTests(TestCase):
         profile.set_instance_privacy_level(EMPLOYEES)
         eq_(profile.full_name, 'foobar')
 
+    def test_privacy_descriptors(self):
+        ok_(isinstance(UserProfile.__dict__['full_name'], PrivacyAwareDescriptor))
+        ok_(isinstance(UserProfile.__dict__['email'], PrivacyAwareAlias))
+        ok_('is_vouched' not in UserProfile.__dict__)
+        # Relations keep their descriptors for class access.
+        ok_(hasattr(UserProfile.geo_country, 'get_queryset'))
+
+        # Installing the descriptors again doesn't wrap them again.
+        descriptor = UserProfile.__dict__['geo_country']
+        UserProfile.install_privacy_descriptors()
+        ok_(UserProfile.__dict__['geo_country'] is descriptor)
+
+    def test_privacy_descriptors_relations(self):
+        user = UserFactory.create(userprofile={'privacy_geo_country': MOZILLIANS})
+        profile = UserProfile.objects.get(id=user.userprofile.id)
+        ok_(profile.geo_country)
+        profile.set_instance_privacy_level(PUBLIC)
+        eq_(profile.geo_country, None)
+        profile.set_instance_privacy_level(MOZILLIANS)
+        eq_(profile.geo_country, user.userprofile.geo_country)
+
+    def test_privacy_descriptors_deferred(self):
+        user = UserFactory.create(userprofile={'ircname': 'foo', 'bio': 'bar',
+                                               'privacy_ircname': MOZILLIANS,
+                                               'privacy_bio': MOZILLIANS})
+        profiles = UserProfile.objects.filter(id=user.userprofile.id).privacy_level(PUBLIC)
+
+        profile = profiles.only('id', 'full_name')[0]
+        ok_(isinstance(profile.__class__.__dict__['ircname'], PrivacyAwareDeferredAttribute))
+        ok_('ircname' in profile.get_deferred_fields())
+        eq_(profile.ircname, '')
+        eq_(profile.bio, '')
+        profile.set_instance_privacy_level(MOZILLIANS)
+        eq_(profile.ircname, 'foo')
+        eq_(profile.bio, 'bar')
+
+        profile = profiles.defer('ircname')[0]
+        eq_(profile.ircname, '')
+        eq_(UserProfile.objects.defer('ircname').get(id=user.userprofile.id).ircname, 'foo')
+
     def test_extract_document(self):
         user = UserFactory.create(userprofile={'allows_community_sites': False,
                                                'allows_mozilla_sites': False,
@@ -221,19 +267,149 @@ class UserProfileTests(TestCase):
         ok_(isinstance(result, dict))
         eq_(result['id'], profile.id)
         eq_(result['is_vouched'], profile.is_vouched)
+        eq_(result['last_updated'], UserProfile.objects.get(id=profile.id).last_updated)
         eq_(result['region'], 'attika')
         eq_(result['city'], 'athens')
         eq_(result['allows_community_sites'], profile.allows_community_sites)
         eq_(result['allows_mozilla_sites'], profile.allows_mozilla_sites)
         eq_(set(result['country']), set(['gr', 'greece']))
+        eq_(result['country_id'], profile.geo_country.id)
+        eq_(result['city_id'], profile.geo_city.id)
         eq_(result['fullname'], profile.full_name.lower())
         eq_(result['name'], profile.full_name.lower())
         eq_(result['bio'], profile.bio)
         eq_(result['has_photo'], False)
         eq_(result['groups'], [group_1.name, group_2.name])
         eq_(result['skills'], [skill_1.name, skill_2.name])
+        eq_(result['group_ids'], [group_1.id, group_2.id])
+        eq_(result['skill_ids'], [skill_1.id, skill_2.id])
+        eq_(result['timezone'], profile.timezone)
         eq_(set(result['languages']),
             set([u'en', u'fr', u'english', u'french', u'français']))
+        eq_(set(result['language_codes']), set([u'en', u'fr']))
+        eq_(result['privacy_full_name'], profile.privacy_full_name)
+        eq_(result['display']['full_name'], 'Nikos Koukos')
+        eq_(result['display']['username'], user.username)
+        eq_(result['display']['email'], user.email)
+        eq_(result['display']['photo'], '')
+        eq_(set(result['suggest']['input']), set(['Nikos Koukos', 'Koukos', user.username]))
+        eq_(result['suggest']['output'], user.username)
+        eq_(result['suggest']['payload'], {'full_name': 'Nikos Koukos'})
+
+    def test_extract_document_location(self):
+        user = UserFactory.create(userprofile={'privacy_geo_city': MOZILLIANS})
+        profile = user.userprofile
+        profile.lat, profile.lng = 39.7, 21.6
+        profile.save()
+        result = UserProfileMappingType.extract_document(profile.id)
+        eq_(result['location'], {'lat': profile.geo_city.lat, 'lon': profile.geo_city.lng})
+        eq_(result['privacy_geo_city'], MOZILLIANS)
+
+        profiles = UserProfile.objects.filter(id=profile.id).privacy_level(PUBLIC)
+        eq_(UserProfileMappingType.extract_documents(profiles)[0]['location'], None)
+
+    def test_extract_document_email_digest(self):
+        user = UserFactory.create(userprofile={'privacy_photo': MOZILLIANS})
+        profile = user.userprofile
+        result = UserProfileMappingType.extract_document(profile.id)
+        eq_(result['display']['email_digest'], md5(user.email).hexdigest())
+
+        profiles = UserProfile.objects.filter(id=profile.id).privacy_level(PUBLIC)
+        eq_(UserProfileMappingType.extract_documents(profiles)[0]['display']['email_digest'], '')
+
+        UserProfile.objects.filter(id=profile.id).update(privacy_photo=PUBLIC)
+        eq_(UserProfileMappingType.extract_documents(profiles)[0]['display']['email_digest'],
+            md5(user.email).hexdigest())
+
+    def test_extract_document_unvouched_without_suggestions(self):
+        user = UserFactory.create(vouched=False)
+        result = UserProfileMappingType.extract_document(user.userprofile.id)
+        ok_('suggest' not in result)
+
+    @override_settings(ES_URLS=['http://es:9200'], ES_TIMEOUT=3,
+                       ES_CONNECTION_OPTIONS={'maxsize': 20})
+    @patch('mozillians.users.es.base_get_es')
+    def test_get_es(self, base_get_es_mock):
+        es = get_es(timeout=10)
+        base_get_es_mock.assert_called_with(urls=['http://es:9200'], timeout=10, maxsize=20)
+        eq_(es, base_get_es_mock.return_value)
+
+    @patch('mozillians.users.es.UserProfileMappingType.get_es')
+    def test_suggest(self, get_es_mock):
+        get_es_mock().suggest.return_value = {
+            'people': [{'text': 'nik', 'options': [
+                {'text': 'nikos', 'score': 1.0, 'payload': {'full_name': 'Nikos Koukos'}}]}]}
+        eq_(UserProfileMappingType.suggest(' Nik', public=True),
+            [{'username': 'nikos', 'full_name': 'Nikos Koukos'}])
+        get_es_mock().suggest.assert_called_with(
+            body={'people': {'text': 'nik', 'completion': {'field': 'suggest', 'size': 10}}},
+            index=UserProfileMappingType.get_index(True))
+
+    @patch('mozillians.users.es.get_es')
+    def test_export(self, get_es_mock):
+        user = UserFactory.create(userprofile={'privacy_email': MOZILLIANS,
+                                               'ircname': 'foo'})
+        document = UserProfileMappingType.extract_document(user.userprofile.id)
+        es = get_es_mock.return_value
+        es.search.return_value = {'_scroll_id': '1', 'hits': {'hits': []}}
+        es.scroll.side_effect = [{'_scroll_id': '2', 'hits': {'hits': [{'_source': document}]}},
+                                 {'_scroll_id': '3', 'hits': {'hits': []}}]
+
+        profiles = list(UserProfileMappingType.export(PUBLIC, public=True, batch_size=10))
+        eq_(len(profiles), 1)
+        eq_(profiles[0]['id'], user.userprofile.id)
+        eq_(profiles[0]['username'], user.username)
+        eq_(profiles[0]['email'], '')
+        eq_(profiles[0]['is_vouched'], True)
+        ok_(profiles[0]['url'].endswith('/u/%s/' % user.username))
+        eq_(es.search.call_args[1]['index'], UserProfileMappingType.get_index(True))
+        eq_(es.search.call_args[1]['search_type'], 'scan')
+        eq_(es.search.call_args[1]['size'], 10)
+        es.scroll.assert_called_with(scroll_id='2', scroll='5m')
+        es.clear_scroll.assert_called_with(scroll_id='3')
+
+    @patch('mozillians.users.es.get_es')
+    def test_export_closed_early(self, get_es_mock):
+        document = UserProfileMappingType.extract_document(UserFactory.create().userprofile.id)
+        es = get_es_mock.return_value
+        es.search.return_value = {'_scroll_id': '1', 'hits': {'hits': []}}
+        es.scroll.return_value = {'_scroll_id': '2', 'hits': {'hits': [{'_source': document}]}}
+
+        profiles = UserProfileMappingType.export(MOZILLIANS)
+        next(profiles)
+        profiles.close()
+        es.clear_scroll.assert_called_with(scroll_id='2')
+
+    def test_extract_documents(self):
+        user_1 = UserFactory.create(userprofile={'privacy_groups': PUBLIC})
+        user_2 = UserFactory.create()
+        group = GroupFactory.create()
+        skill = SkillFactory.create()
+        LanguageFactory.create(code='fr', userprofile=user_2.userprofile)
+        group.add_member(user_1.userprofile)
+        group.add_member(user_2.userprofile)
+        user_1.userprofile.skills.add(skill)
+        user_2.userprofile.skills.add(skill)
+
+        profiles = (UserProfile.objects.filter(id__in=[user_1.userprofile.id,
+                                                       user_2.userprofile.id])
+                    .select_related('user', 'geo_country', 'geo_region', 'geo_city')
+                    .privacy_level(PUBLIC).order_by('id'))
+        with self.assertNumQueries(4):
+            documents = UserProfileMappingType.extract_documents(profiles)
+        eq_(documents[0]['groups'], [group.name])
+        eq_(documents[0]['group_ids'], [group.id])
+        eq_(documents[0]['skills'], [])
+        eq_(documents[0]['skill_ids'], [])
+        eq_(documents[1]['groups'], [])
+        eq_(documents[1]['group_ids'], [])
+        eq_(documents[1]['languages'], [])
+
+        documents = UserProfileMappingType.extract_documents(
+            UserProfile.objects.filter(id=user_2.userprofile.id))
+        eq_(documents[0]['skills'], [skill.name])
+        eq_(set(documents[0]['languages']), set([u'fr', u'french', u'français']))
+        eq_(documents[0], UserProfileMappingType.extract_document(user_2.userprofile.id))
 
     def test_get_mapping(self):
         ok_(UserProfileMappingType.get_mapping())
@@ -248,6 +424,167 @@ class UserProfileTests(TestCase):
         eq_(len(q), 1)
         eq_(q[0]._privacy_level, PUBLIC)
 
+    def search_results(self, objects):
+        results = MagicMock(count=len(objects), response={})
+        results.__iter__.side_effect = lambda: iter(objects)
+        return results
+
+    @patch('mozillians.users.es.S.execute')
+    def test_privacy_aware_iterator_source_only(self, execute_mock):
+        user = UserFactory.create(userprofile={'privacy_full_name': PUBLIC,
+                                               'ircname': 'foo'})
+        document = UserProfileMappingType.extract_document(user.userprofile.id)
+        execute_mock.return_value = self.search_results(
+            [Mock(_id=str(user.userprofile.id), es_meta=Mock(source=document))])
+        s = PrivacyAwareS(UserProfileMappingType).privacy_level(PUBLIC).source_only()
+
+        with self.assertNumQueries(0):
+            results = list(s)
+        eq_(len(results), 1)
+        ok_(isinstance(results[0], UserProfileSearchResult))
+        eq_(results[0].id, user.userprofile.id)
+        eq_(results[0].user.username, user.username)
+        eq_(results[0].display_name, user.userprofile.full_name)
+        eq_(results[0].ircname, '')
+        eq_(results[0].email, '')
+
+    @patch('mozillians.users.es.get_thumbnail')
+    def test_search_result_private_photo(self, get_thumbnail_mock):
+        get_thumbnail_mock.return_value = Mock(url='/avatar.png')
+        user = UserFactory.create(userprofile={'privacy_photo': MOZILLIANS})
+        document = UserProfileMappingType.extract_document(user.userprofile.id)
+        result = UserProfileSearchResult(document, PUBLIC)
+        eq_(result.pk, user.userprofile.id)
+        # No gravatar stands in for the hidden photo.
+        ok_(result.get_photo_url('70x70').endswith('/avatar.png'))
+        get_thumbnail_mock.assert_called_with(settings.DEFAULT_AVATAR_PATH, '70x70',
+                                              crop='center')
+
+    @patch('mozillians.users.es.S.execute')
+    def test_privacy_aware_iterator_bulk_fetch(self, execute_mock):
+        user_1 = UserFactory.create()
+        user_2 = UserFactory.create()
+        execute_mock.return_value = self.search_results(
+            [Mock(_id=str(user_2.userprofile.id)), Mock(_id='0'),
+             Mock(_id=str(user_1.userprofile.id))])
+        s = PrivacyAwareS(UserProfileMappingType).privacy_level(PUBLIC)
+
+        with self.assertNumQueries(1):
+            profiles = list(s)
+            eq_(profiles, [user_2.userprofile, user_1.userprofile])
+            eq_(profiles[0].user, user_2)
+        eq_(profiles[0]._privacy_level, PUBLIC)
+        eq_(profiles[1]._privacy_level, PUBLIC)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    @patch('mozillians.users.es.S.execute')
+    def test_privacy_aware_cached(self, execute_mock):
+        user = UserFactory.create()
+        execute_mock.return_value = self.search_results([Mock(_id=str(user.userprofile.id))])
+        s = PrivacyAwareS(UserProfileMappingType).query(fullname__match='foo').cached()
+
+        eq_(list(s[:10]), [user.userprofile])
+        eq_(s[:10].count(), 1)
+        eq_(list(s[:10]), [user.userprofile])
+        eq_(execute_mock.call_count, 1)
+
+        # Other slices and searches are cached separately.
+        eq_(list(s[10:20]), [user.userprofile])
+        eq_(execute_mock.call_count, 2)
+
+        invalidate_search_cache()
+        eq_(list(s[:10]), [user.userprofile])
+        eq_(execute_mock.call_count, 3)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    @patch('mozillians.users.es.S.execute')
+    def test_privacy_aware_aggregations(self, execute_mock):
+        aggregations = {'groups': {'buckets': [{'key': 1, 'doc_count': 2}]}}
+        execute_mock.return_value = self.search_results([])
+        execute_mock.return_value.response = {'aggregations': aggregations}
+        s = (PrivacyAwareS(UserProfileMappingType).filter(is_vouched=True)
+             .aggregate(groups={'terms': {'field': 'group_ids'}}).cached())
+
+        body = s.build_search()
+        eq_(body['aggs'], {'groups': {'terms': {'field': 'group_ids'}}})
+        # Filters apply to the aggregations too.
+        ok_('filter' not in body)
+        eq_(body['query'], {'filtered': {'query': {'match_all': {}},
+                                         'filter': {'term': {'is_vouched': True}}}})
+
+        eq_(s.aggregations(), aggregations)
+        eq_(s.cached().aggregations(), aggregations)
+        eq_(execute_mock.call_count, 1)
+
+    def test_get_facets(self):
+        group = GroupFactory.create(name='foo')
+        hidden_group = GroupFactory.create(visible=False)
+        skill = SkillFactory.create(name='bar')
+        user = UserFactory.create()
+        country = user.userprofile.geo_country
+        aggregations = {
+            'country': {'buckets': [{'key': country.id, 'doc_count': 3}]},
+            'groups': {'buckets': [{'key': group.id, 'doc_count': 2},
+                                   {'key': hidden_group.id, 'doc_count': 1}]},
+            'skills': {'buckets': [{'key': skill.id, 'doc_count': 1}]},
+            'languages': {'buckets': [{'key': 'fr', 'doc_count': 1}]}
+        }
+        facets = UserProfileMappingType.get_facets(aggregations)
+        eq_(facets['country'], [{'id': country.id, 'name': country.name, 'count': 3}])
+        eq_(facets['city'], [])
+        eq_(facets['groups'], [{'id': group.id, 'name': 'foo', 'count': 2}])
+        eq_(facets['skills'], [{'id': skill.id, 'name': 'bar', 'count': 1}])
+        eq_(facets['languages'], [{'id': 'fr', 'name': 'French', 'count': 1}])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_get_facet_names_cached(self):
+        group = GroupFactory.create(name='foo')
+        hidden_group = GroupFactory.create(visible=False)
+        ids = [group.id, hidden_group.id]
+        with self.assertNumQueries(1):
+            eq_(UserProfileMappingType.get_facet_names('groups', ids),
+                {group.id: 'foo', hidden_group.id: ''})
+            eq_(UserProfileMappingType.get_facet_names('groups', ids),
+                {group.id: 'foo', hidden_group.id: ''})
+
+        group.name = 'bar'
+        group.save()
+        eq_(UserProfileMappingType.get_facet_names('groups', [group.id]), {group.id: 'bar'})
+
+    @patch('mozillians.users.es.PrivacyAwareS')
+    def test_search_facets(self, PrivacyAwareSMock):
+        UserProfileMappingType.search('foo', facets=True)
+        aggregate = PrivacyAwareSMock().indexes().boost().query().order_by().filter().aggregate
+        eq_(set(aggregate.call_args[1]),
+            set(['country', 'city', 'groups', 'skills', 'languages']))
+        eq_(aggregate.call_args[1]['groups'], {'terms': {'field': 'group_ids', 'size': 10}})
+
+    @override_settings(ES_INDEXES={'default': 'index'})
+    @patch('mozillians.users.es.PrivacyAwareS')
+    def test_search_near(self, PrivacyAwareSMock):
+        result = UserProfileMappingType.search_near(39.7, 21.6, 10, privacy_level=EMPLOYEES)
+        ok_(isinstance(result, Mock))
+        PrivacyAwareSMock().indexes.assert_called_with('index')
+        point = {'lat': 39.7, 'lon': 21.6}
+        PrivacyAwareSMock().indexes().filter_raw.assert_called_with({'and': [
+            {'geo_distance': {'distance': '10km', 'location': point}},
+            {'range': {'privacy_geo_city': {'gte': EMPLOYEES}}},
+            {'term': {'is_vouched': True}}]})
+        PrivacyAwareSMock().indexes().filter_raw().order_by.assert_called_with(
+            {'_geo_distance': {'location': point, 'order': 'asc', 'unit': 'km'}})
+
+    @override_settings(ES_INDEXES={'public': 'public_index'})
+    @patch('mozillians.users.es.PrivacyAwareS')
+    def test_search_near_public(self, PrivacyAwareSMock):
+        UserProfileMappingType.search_near(39.7, 21.6, 10, privacy_level=EMPLOYEES, public=True)
+        PrivacyAwareSMock().privacy_level.assert_called_with(PUBLIC)
+        PrivacyAwareSMock().privacy_level().indexes.assert_called_with('public_index')
+        filters = PrivacyAwareSMock().privacy_level().indexes().filter_raw.call_args[0][0]
+        ok_({'range': {'privacy_geo_city': {'gte': PUBLIC}}} in filters['and'])
+
     @override_settings(ES_INDEXES={'default': 'index'})
     @patch('mozillians.users.es.PrivacyAwareS')
     def test_search_no_public_only_vouched(self, PrivacyAwareSMock):
@@ -639,6 +976,33 @@ class UserProfileTests(TestCase):
         user = UserFactory.create(is_superuser=True)
         ok_(user.userprofile.is_manager)
 
+    def test_privacy_level_cached(self):
+        user = UserFactory.create()
+        profile = UserProfile.objects.get(pk=user.userprofile.pk)
+        with self.assertNumQueries(3):
+            eq_(profile.privacy_level, MOZILLIANS)
+            ok_(not profile.is_manager)
+            eq_(profile.privacy_level, MOZILLIANS)
+
+    def test_privacy_level_cache_cleared_on_group_membership(self):
+        user = UserFactory.create()
+        profile = user.userprofile
+        eq_(profile.privacy_level, MOZILLIANS)
+        group, _ = Group.objects.get_or_create(name='staff')
+        group.add_member(profile)
+        eq_(profile.privacy_level, EMPLOYEES)
+        group.remove_member(profile)
+        eq_(profile.privacy_level, MOZILLIANS)
+
+    def test_is_manager_cache_cleared_on_user_groups(self):
+        user = UserFactory.create()
+        profile = user.userprofile
+        ok_(not profile.is_manager)
+        managers, _ = AuthGroup.objects.get_or_create(name='Managers')
+        user.groups.add(managers)
+        ok_(profile.is_manager)
+        eq_(profile.privacy_level, PRIVILEGED)
+
 
 class VouchTests(TestCase):
     @override_settings(CAN_VOUCH_THRESHOLD=1)
@@ -778,6 +1142,52 @@ class ExternalAccountTests(TestCase):
                 ok_('{identifier}' in account['url'])
 
 
+class UserProfileViewTests(TestCase):
+    def values(self, **kwargs):
+        values = {'id': 1, 'user__username': 'foo', 'user__email': 'foo@example.com',
+                  'full_name': 'Foo', 'ircname': 'bar', 'photo': '', 'is_vouched': True,
+                  'privacy_full_name': PUBLIC, 'privacy_email': MOZILLIANS,
+                  'privacy_ircname': MOZILLIANS, 'privacy_photo': MOZILLIANS}
+        values.update(kwargs)
+        return values
+
+    def test_privacy(self):
+        view = UserProfileView(self.values(), PUBLIC)
+        eq_(view.pk, 1)
+        eq_(view.display_name, 'Foo')
+        eq_(view.email, '')
+        eq_(view.ircname, '')
+        ok_(view.get_absolute_url().endswith('/u/foo/'))
+
+        view = UserProfileView(self.values(), MOZILLIANS)
+        eq_(view.email, 'foo@example.com')
+        eq_(view.ircname, 'bar')
+
+    def test_read_only(self):
+        view = UserProfileView(self.values())
+        with self.assertRaises(AttributeError):
+            view.full_name = 'Bar'
+        with self.assertRaises(AttributeError):
+            view.foo = 'bar'
+        with self.assertRaises(AttributeError):
+            del view.full_name
+
+    @patch('mozillians.users.es.gravatar_from_digest')
+    def test_get_photo_url_gravatar(self, gravatar_mock):
+        gravatar_mock.return_value = 'gravatar'
+        view = UserProfileView(self.values(), MOZILLIANS)
+        eq_(view.get_photo_url('70x70'), 'gravatar')
+        gravatar_mock.assert_called_with(md5('foo@example.com').hexdigest(), size='70x70')
+
+    @patch('mozillians.users.es.get_thumbnail')
+    def test_get_photo_url_private(self, get_thumbnail_mock):
+        get_thumbnail_mock.return_value = Mock(url='/avatar.png')
+        view = UserProfileView(self.values(photo='photo.jpg'), PUBLIC)
+        ok_(view.get_photo_url('70x70').endswith('/avatar.png'))
+        get_thumbnail_mock.assert_called_with(settings.DEFAULT_AVATAR_PATH, '70x70',
+                                              crop='center')
+
+
 class PrivacyModelTests(unittest.TestCase):
     def setUp(self):
         UserProfile.clear_privacy_fields_cache()
@@ -1,20 +1,28 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth.models import User
 from django.test.utils import override_settings
+from django.utils import timezone
 
+from celery.exceptions import MaxRetriesExceededError
 from elasticsearch.exceptions import NotFoundError
 from mock import MagicMock, Mock, call, patch
 from nose.tools import eq_, ok_
 
 from mozillians.common.tests import TestCase
 from mozillians.groups.tests import GroupFactory
-from mozillians.users.managers import PUBLIC
-from mozillians.users.models import UserProfile
-from mozillians.users.tasks import (_email_basket_managers, index_objects,
-                                    remove_incomplete_accounts, unindex_objects,
-                                    unsubscribe_from_basket_task)
+from mozillians.users.managers import MOZILLIANS, PUBLIC
+from mozillians.users.models import UserProfile, UserProfileMappingType
+from mozillians.users.tasks import (INDEX_QUEUE_HEAD_KEY, INDEX_QUEUE_KEY, INDEX_QUEUE_LOCK_KEY,
+                                    INDEX_QUEUE_TAIL_KEY, REFRESH_NEVER, REFRESH_PER_CHUNK,
+                                    _email_basket_managers, flush_index_queue,
+                                    index_objects, queue_index_update,
+                                    reindex_profiles_task, remove_incomplete_accounts,
+                                    switch_index_alias,
+                                    unindex_objects, unsubscribe_from_basket_task,
+                                    update_vouch_flags)
 from mozillians.users.tests import UserFactory
 
 
@@ -41,6 +49,23 @@ class IncompleteAccountsTests(TestCase):
         ok_(not User.objects.filter(id=incomplete_user_old.id).exists())
 
 
+class UpdateVouchFlagsTests(TestCase):
+    @patch('mozillians.users.tasks.reindex_profiles_task.delay')
+    def test_update_vouch_flags(self, reindex_profiles_mock):
+        user = UserFactory.create(vouched=False)
+        UserProfile.objects.filter(id=user.userprofile.id).update(is_vouched=True)
+        update_vouch_flags()
+        ok_(not UserProfile.objects.get(id=user.userprofile.id).is_vouched)
+        reindex_profiles_mock.assert_called_once_with([user.userprofile.id])
+
+    @patch('mozillians.users.tasks.reindex_profiles')
+    def test_reindex_profiles_task(self, reindex_profiles_mock):
+        user = UserFactory.create()
+        UserFactory.create()
+        reindex_profiles_task([user.userprofile.id])
+        eq_(list(reindex_profiles_mock.call_args[0][0]), [user.userprofile])
+
+
 @override_settings(ES_DISABLED=False)
 class ElasticSearchIndexTests(TestCase):
     @patch('mozillians.users.tasks.get_es')
@@ -50,12 +75,13 @@ class ElasticSearchIndexTests(TestCase):
         mapping_type = MagicMock()
         model = MagicMock()
         mapping_type.get_model.return_value = model
-        model.objects.filter.return_value = [user_1.userprofile,
-                                             user_2.userprofile]
-        mapping_type.extract_document.return_value = 'foo'
+        qs = [user_1.userprofile, user_2.userprofile]
+        model.objects.filter().select_related.return_value = qs
+        mapping_type.extract_documents.return_value = ['foo', 'foo']
         index_objects(mapping_type,
                       [user_1.userprofile.id, user_2.userprofile.id],
                       public_index=False)
+        mapping_type.extract_documents.assert_called_with(qs)
         mapping_type.bulk_index.assert_has_calls([
             call(['foo', 'foo'], id_field='id', es=get_es_mock(),
                  index=mapping_type.get_index(False))])
@@ -67,31 +93,58 @@ class ElasticSearchIndexTests(TestCase):
         mapping_type = MagicMock()
         model = MagicMock()
         mapping_type.get_model.return_value = model
-        qs = model.objects.filter().public_indexable().privacy_level
+        qs = model.objects.filter().select_related().public_indexable().privacy_level
         qs.return_value = [user_1.userprofile, user_2.userprofile]
-        mapping_type.extract_document.return_value = 'foo'
+        mapping_type.extract_documents.return_value = ['foo', 'foo']
         index_objects(mapping_type,
                       [user_1.userprofile.id, user_2.userprofile.id],
                       public_index=True)
 
         model.objects.assert_has_calls([
             call.filter(id__in=(user_1.userprofile.id, user_2.userprofile.id)),
-            call.filter().public_indexable(),
-            call.filter().public_indexable().privacy_level(PUBLIC),
+            call.filter().select_related('user', 'geo_country', 'geo_region', 'geo_city'),
+            call.filter().select_related().public_indexable(),
+            call.filter().select_related().public_indexable().privacy_level(PUBLIC),
         ])
         mapping_type.bulk_index.assert_has_calls([
             call(['foo', 'foo'], id_field='id', es=get_es_mock(),
                  index=mapping_type.get_index(True))])
 
+    @patch('mozillians.users.tasks.get_es')
+    def test_index_objects_refresh(self, get_es_mock):
+        mapping_type = MagicMock()
+        mapping_type.get_index.return_value = 'index'
+
+        index_objects(mapping_type, [1, 2, 3], chunk_size=1)
+        mapping_type.refresh_index.assert_called_once_with(get_es_mock(), index='index')
+
+        mapping_type.reset_mock()
+        index_objects(mapping_type, [1, 2, 3], chunk_size=1, refresh=REFRESH_PER_CHUNK)
+        eq_(mapping_type.refresh_index.call_count, 3)
+
+        mapping_type.reset_mock()
+        index_objects(mapping_type, [1, 2, 3], chunk_size=1, index='new-index',
+                      refresh=REFRESH_NEVER)
+        ok_(not mapping_type.refresh_index.called)
+        mapping_type.bulk_index.assert_called_with(
+            mapping_type.extract_documents(), id_field='id', es=get_es_mock(),
+            index='new-index')
+
     @patch('mozillians.users.tasks.get_es')
     def test_unindex_objects(self, get_es_mock):
         mapping_type = MagicMock()
+        mapping_type.bulk_unindex.return_value = []
+        unindex_objects(mapping_type, [1, 2, 3], 'foo')
+        mapping_type.bulk_unindex.assert_called_with(
+            [1, 2, 3], es=get_es_mock(), public_index='foo')
+
+    @patch('mozillians.users.tasks.logger')
+    @patch('mozillians.users.tasks.get_es')
+    def test_unindex_objects_failures(self, get_es_mock, logger_mock):
+        mapping_type = MagicMock()
+        mapping_type.bulk_unindex.return_value = [2]
         unindex_objects(mapping_type, [1, 2, 3], 'foo')
-        ok_(mapping_type.unindex.called)
-        mapping_type.assert_has_calls([
-            call.unindex(1, es=get_es_mock(), public_index='foo'),
-            call.unindex(2, es=get_es_mock(), public_index='foo'),
-            call.unindex(3, es=get_es_mock(), public_index='foo')])
+        ok_(logger_mock.error.called)
 
     def test_unindex_raises_not_found_exception(self):
         exception = NotFoundError(404, {'not found': 'not found '}, {'foo': 'foo'})
@@ -99,6 +152,192 @@ class ElasticSearchIndexTests(TestCase):
         mapping_type.unindex(side_effect=exception)
         unindex_objects(mapping_type, [1, 2, 3], 'foo')
 
+    @patch('mozillians.users.es.bulk')
+    def test_bulk_unindex(self, bulk_mock):
+        es = Mock()
+        bulk_mock.return_value = (1, [{'delete': {'_id': '2', 'status': 404}},
+                                      {'delete': {'_id': '3', 'status': 500}}])
+        failed_ids = UserProfileMappingType.bulk_unindex([1, 2, 3], es=es)
+        eq_(failed_ids, [3])
+        actions = bulk_mock.call_args[0][1]
+        eq_([action['_id'] for action in actions], [1, 2, 3])
+        eq_(set(action['_op_type'] for action in actions), set(['delete']))
+        eq_(bulk_mock.call_args[1], {'chunk_size': 3})
+
+
+@override_settings(ES_DISABLED=False, ES_INDEX_QUEUE=True,
+                   CACHES={'default': {
+                       'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class IndexQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch('mozillians.users.models.index_objects.delay')
+    @patch('mozillians.users.tasks.unindex_objects')
+    @patch('mozillians.users.tasks.index_objects')
+    def test_flush_index_queue(self, index_objects_mock, unindex_objects_mock,
+                               index_objects_delay_mock):
+        user_1 = UserFactory.create()
+        user_2 = UserFactory.create(userprofile={'privacy_full_name': PUBLIC})
+        incomplete = UserFactory.create(userprofile={'full_name': ''})
+        user_1.userprofile.save()
+        queue_index_update(incomplete.userprofile.id)
+        ok_(not index_objects_delay_mock.called)
+
+        flush_index_queue()
+        index_objects_mock.assert_has_calls([
+            call(UserProfileMappingType, [user_1.userprofile.id, user_2.userprofile.id],
+                 public_index=False),
+            call(UserProfileMappingType, [user_2.userprofile.id], public_index=True)])
+        unindex_objects_mock.assert_has_calls([
+            call(UserProfileMappingType, [incomplete.userprofile.id], public_index=False),
+            call(UserProfileMappingType,
+                 sorted([user_1.userprofile.id, incomplete.userprofile.id]), public_index=True)])
+
+        # The queue is empty after a flush.
+        index_objects_mock.reset_mock()
+        flush_index_queue()
+        ok_(not index_objects_mock.called)
+
+    @patch('mozillians.users.tasks.reindex_profiles')
+    def test_flush_index_queue_missing_entry(self, reindex_profiles_mock):
+        queue_index_update(1)
+        queue_index_update(2)
+        cache.delete('{0}:1'.format(INDEX_QUEUE_KEY))
+
+        flush_index_queue()
+        profiles = reindex_profiles_mock.call_args[0][0]
+        ok_('IN (2)' in str(profiles.query))
+        eq_(cache.get(INDEX_QUEUE_HEAD_KEY), 2)
+
+    @patch('mozillians.users.tasks.reindex_profiles')
+    def test_queue_after_tail_eviction(self, reindex_profiles_mock):
+        queue_index_update(1)
+        flush_index_queue()
+        cache.delete(INDEX_QUEUE_TAIL_KEY)
+
+        queue_index_update(2)
+        eq_(cache.get(INDEX_QUEUE_TAIL_KEY), 2)
+        flush_index_queue()
+        profiles = reindex_profiles_mock.call_args[0][0]
+        ok_('IN (2)' in str(profiles.query))
+
+    @patch('mozillians.users.tasks.INDEX_QUEUE_LOCK_ATTEMPTS', 1)
+    @patch('mozillians.users.tasks.reindex_profiles')
+    def test_locked_queue(self, reindex_profiles_mock):
+        queue_index_update(1)
+        cache.add(INDEX_QUEUE_LOCK_KEY, 1)
+        ok_(not queue_index_update(2))
+        flush_index_queue()
+        ok_(not reindex_profiles_mock.called)
+
+    @override_settings(ES_INDEX_QUEUE=False)
+    @patch('mozillians.users.tasks.reindex_profiles')
+    def test_flush_disabled_queue(self, reindex_profiles_mock):
+        cache.set(INDEX_QUEUE_TAIL_KEY, 1)
+        cache.set('{0}:1'.format(INDEX_QUEUE_KEY), 1)
+        flush_index_queue()
+        ok_(not reindex_profiles_mock.called)
+
+
+@override_settings(ES_DISABLED=False)
+class SwitchIndexAliasTests(TestCase):
+    @patch('mozillians.users.tasks.invalidate_search_cache')
+    @patch('mozillians.users.tasks.scan')
+    @patch('mozillians.users.tasks.unindex_objects.delay')
+    @patch('mozillians.users.tasks.index_objects.delay')
+    @patch('mozillians.users.tasks.get_es')
+    def test_switch_index_alias(self, get_es_mock, index_objects_mock, unindex_objects_mock,
+                                scan_mock, invalidate_search_cache_mock):
+        user = UserFactory.create()
+        scan_mock.return_value = [{'_id': str(user.userprofile.id)}]
+        es = get_es_mock()
+        es.count.return_value = {'count': 1}
+        es.indices.exists_alias.return_value = True
+        es.indices.get_alias.return_value = {'old-index': {'aliases': {'alias': {}}}}
+        mapping_type = MagicMock()
+        mapping_type.get_model.return_value = UserProfile
+        mapping_type.get_index.return_value = 'alias'
+
+        switch_index_alias(mapping_type, 'new-index', False, datetime(2000, 1, 1))
+        es.indices.put_settings.assert_called_with(
+            index='new-index', body={'index': {'refresh_interval': '1s'}})
+        es.indices.update_aliases.assert_called_with(body={'actions': [
+            {'remove': {'index': 'old-index', 'alias': 'alias'}},
+            {'add': {'index': 'new-index', 'alias': 'alias'}}]})
+        es.indices.delete.assert_called_with(index='old-index', ignore=404)
+        ok_(invalidate_search_cache_mock.called)
+        ok_(index_objects_mock.called)
+        ok_(not unindex_objects_mock.called)
+
+    @patch('mozillians.users.tasks.invalidate_search_cache')
+    @patch('mozillians.users.tasks.scan')
+    @patch('mozillians.users.tasks.unindex_objects.delay')
+    @patch('mozillians.users.tasks.index_objects.delay')
+    @patch('mozillians.users.tasks.get_es')
+    def test_switch_index_alias_after_changes(self, get_es_mock, index_objects_mock,
+                                              unindex_objects_mock, scan_mock,
+                                              invalidate_search_cache_mock):
+        since = timezone.now() - timedelta(days=1)
+        indexed = UserFactory.create(userprofile={'privacy_full_name': PUBLIC})
+        not_public = UserFactory.create(userprofile={'privacy_full_name': PUBLIC})
+        deleted = UserFactory.create(userprofile={'privacy_full_name': PUBLIC})
+        ids = [indexed.userprofile.id, not_public.userprofile.id, deleted.userprofile.id]
+        UserProfile.objects.filter(id__in=ids).update(last_updated=since - timedelta(days=1))
+        scan_mock.return_value = [{'_id': str(id_)} for id_ in ids]
+        # Changes while the index was being built.
+        created = UserFactory.create(userprofile={'privacy_full_name': PUBLIC})
+        UserProfile.objects.filter(id=not_public.userprofile.id).update(
+            privacy_full_name=MOZILLIANS, last_updated=timezone.now())
+        deleted.delete()
+        es = get_es_mock()
+        es.count.return_value = {'count': 1}
+        es.indices.exists_alias.return_value = False
+        es.indices.exists.return_value = False
+        mapping_type = MagicMock()
+        mapping_type.get_model.return_value = UserProfile
+        mapping_type.get_index.return_value = 'alias'
+
+        switch_index_alias(mapping_type, 'new-index', True, since)
+        ok_(es.indices.update_aliases.called)
+        index_objects_mock.assert_called_with(
+            mapping_type, [created.userprofile.id], public_index=True)
+        unindex_objects_mock.assert_called_with(
+            mapping_type, sorted(ids[1:]), public_index=True)
+
+    @patch('mozillians.users.tasks.scan')
+    @patch('mozillians.users.tasks.get_es')
+    def test_switch_index_alias_replaces_index(self, get_es_mock, scan_mock):
+        es = get_es_mock()
+        es.count.return_value = {'count': 0}
+        es.indices.exists_alias.return_value = False
+        es.indices.exists.return_value = True
+        mapping_type = MagicMock()
+        mapping_type.get_model.return_value = UserProfile
+        mapping_type.get_index.return_value = 'alias'
+
+        switch_index_alias(mapping_type, 'new-index', True, datetime(2000, 1, 1))
+        es.indices.delete.assert_called_with(index='alias')
+        es.indices.update_aliases.assert_called_with(body={'actions': [
+            {'add': {'index': 'new-index', 'alias': 'alias'}}]})
+
+    @patch('mozillians.users.tasks.switch_index_alias.retry')
+    @patch('mozillians.users.tasks.get_es')
+    def test_switch_index_alias_incomplete_index(self, get_es_mock, retry_mock):
+        user = UserFactory.create()
+        UserProfile.objects.filter(id=user.userprofile.id).update(
+            last_updated=timezone.now() - timedelta(days=2))
+        es = get_es_mock()
+        es.count.return_value = {'count': 0}
+        retry_mock.side_effect = MaxRetriesExceededError
+        mapping_type = MagicMock()
+        mapping_type.get_model.return_value = UserProfile
+
+        switch_index_alias(mapping_type, 'new-index', False, timezone.now() - timedelta(days=1))
+        ok_(retry_mock.called)
+        ok_(not es.indices.update_aliases.called)
+        es.indices.delete.assert_called_with(index='new-index', ignore=404)
+
 
 class BasketTests(TestCase):
     @override_settings(BASKET_MANAGERS=False)